@@ -0,0 +1,273 @@
+'''
+Microbenchmarks of the simulation's hot components, each run in isolation
+on synthetic inputs:
+
+    brain         Brain.compute and Brain construction on genomes of growing size
+    population    PopulationBrain.compute over whole populations
+    food          SimWorld.is_touching_food against food sets up to max_food
+    physics       one b2World step with 10 to 10k podd bodies in a walled box, zero gravity
+    reproduction  Podd.new_genome, SimWorld.add_podd and kill_podd
+
+Every case reports ops/sec and latency percentiles. Results are saved as
+JSON and compared against a stored baseline, if there is one.
+
+python bench.py                      # everything, compared to bench_baseline.json
+python bench.py brain food --time 2  # some components, 2 s per case
+python bench.py --save-baseline      # store this run as the new baseline
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description="Benchmark EvoSim components")
+parser.add_argument("components", nargs="*", help="brain, population, food, physics, reproduction (default: all)")
+parser.add_argument("--time", type=float, default=1.0, help="seconds spent per case")
+parser.add_argument("--out", default="bench_results.json", help="where to save the results")
+parser.add_argument("--baseline", default="bench_baseline.json", help="results to compare against")
+parser.add_argument("--save-baseline", action="store_true", help="also save the results as the baseline")
+parser.add_argument("--tolerance", type=float, default=0.1, help="relative ops/sec drop reported as a regression")
+parser.add_argument("--seed", type=int, default=0)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+import numpy as np
+import Box2D as b2d
+from math import sqrt
+
+from bodypool import BodyPool
+from brain_engine import PopulationBrain
+from podd import Podd, Brain
+from rng import streams
+from population import PoddStore
+from spatial import FoodGrid
+from topology import topologies
+from settings import FrameworkSettings as FS, WorldSettings as WS, BrainSettings as BS
+from world import SimWorld
+
+MIN_OPS = 5  # samples per case, even when they take longer than --time
+
+
+def measure(op, setup=None, duration=1.0, warmup=3):
+    '''
+    Times op() (or op(setup()), setup is not timed) one call at a time until
+    `duration` seconds have passed. Returns ops/sec and latency stats in µs.
+    '''
+    for _ in range(warmup):
+        op(setup()) if setup else op()
+    samples = []
+    t_end = time.perf_counter() + duration
+    while len(samples) < MIN_OPS or time.perf_counter() < t_end:
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        op(arg) if setup else op()
+        samples.append(time.perf_counter() - t0)
+    samples = np.array(samples) * 1e6
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {"ops": len(samples), "ops_per_sec": 1e6 / samples.mean(), "mean_us": samples.mean(),
+            "p50_us": p50, "p90_us": p90, "p99_us": p99, "max_us": samples.max()}
+
+
+def random_genome(n_connections, n_hidden):
+    ''' Brain genome with n_connections random edges between inputs, n_hidden hidden nodes and outputs '''
+    inputs = [f"i{i:04}" for i in range(BS.n_inputs)]
+    hidden = [f"{i:04}" for i in random.sample(range(1, BS.max_node), n_hidden)]
+    outputs = [f"o{i:04}" for i in range(BS.n_outputs)]
+    genome = {}
+    while len(genome) < n_connections:
+        src = random.choice(inputs + hidden)
+        tgt = random.choice(hidden + outputs)
+        if src != tgt:
+            genome[f"{src}-{tgt}"] = random.normalvariate(0, 1)
+    return genome
+
+
+def random_podd_genome(n_connections=16):
+    return {"size": random.uniform(0.5, 2), "strength": 1, "birth_energy": 50,
+            "brain": random_genome(n_connections, max(1, n_connections // 4))}
+
+
+def random_position(box=WS.spawn_food_box/WS.grid):
+    return (random.uniform(-box, box), random.uniform(-box, box))
+
+
+class NullSink:
+    def write(self, *values):
+        pass
+
+    def close(self):
+        pass
+
+
+class BenchWorld:
+    '''
+    The state SimWorld's food, body and podd methods work on, without the
+    framework, renderer and output sinks, so those methods can be timed alone.
+    '''
+    is_touching_food = SimWorld.is_touching_food
+    create_body = SimWorld.create_body
+    add_podd = SimWorld.add_podd
+    kill_podd = SimWorld.kill_podd
+    first_id = SimWorld.first_id
+    id_step = SimWorld.id_step
+
+    def __init__(self, food=()):
+        self.world = b2d.b2World(gravity=(0, 0))
+        self.pool = BodyPool(self.world)
+        self.food = FoodGrid(WS.food_cell_size, food)
+        self.podds = {}
+        self.store = PoddStore()
+        self.brains = PopulationBrain()
+        self.census = NullSink()
+        self.lineage = None
+        self.next_id = self.first_id
+
+
+def bench_brain(duration):
+    results = {}
+    for n_connections in (4, 16, 64, 256):
+        brain = Brain(random_genome(n_connections, max(1, n_connections // 4)))
+        inputs = np.random.random(BS.n_inputs)
+        results[f"brain.compute[connections={n_connections}]"] = measure(lambda: brain.compute(inputs), duration=duration)
+        # a new Brain compiles its topology (cold) or takes it from the topology cache (warm)
+        results[f"brain.init_cold[connections={n_connections}]"] = measure(
+            lambda genome: Brain(genome), lambda: topologies.clear() or brain.genome, duration)
+        results[f"brain.init_warm[connections={n_connections}]"] = measure(lambda: Brain(brain.genome), duration=duration)
+    return results
+
+
+def bench_population(duration):
+    results = {}
+    for n_brains in (10, 100, 1000):
+        engine = PopulationBrain()
+        for key in range(n_brains):
+            engine.add(key, Brain(random_genome(16, 4)))
+        inputs = np.random.random((n_brains, BS.n_inputs))
+        engine.compute(inputs)
+        results[f"population.compute[brains={n_brains}]"] = measure(lambda: engine.compute(inputs), duration=duration)
+    return results
+
+
+def bench_food(duration):
+    results = {}
+    host = BenchWorld()
+    fixture = host.create_body({"size": 1}, (0, 0), 0, 0)
+    body = fixture.body
+
+    def place():
+        body.transform = (random_position(), random.uniform(0, 6.28))
+
+    for n_food in (WS.init_food, 1000, WS.max_food):
+        host.food = FoodGrid(WS.food_cell_size, [random_position() for _ in range(n_food)])
+        results[f"food.is_touching_food[food={n_food}]"] = measure(lambda _: host.is_touching_food(0, fixture), place, duration)
+    return results
+
+
+def bench_physics(duration):
+    results = {}
+    for n_bodies in (10, 100, 1000, 10000):
+        host = BenchWorld()
+        box = max(5, sqrt(n_bodies) * 2)  # same density for every population size
+        corners = [(box, box), (-box, box), (-box, -box), (box, -box)]
+        host.world.CreateStaticBody(fixtures=[b2d.b2FixtureDef(shape=b2d.b2EdgeShape(vertices=[a, b]), friction=0)
+                                              for a, b in zip(corners, corners[1:] + corners[:1])])
+        for i in range(n_bodies):
+            fixture = host.create_body({"size": random.uniform(0.5, 2)}, random_position(box), random.uniform(0, 6.28), i)
+            fixture.body.linearVelocity = (random.uniform(-2, 2), random.uniform(-2, 2))
+            fixture.body.sleepingAllowed = False  # podds are pushed every frame, they rarely sleep
+        world = host.world
+        results[f"physics.step[bodies={n_bodies}]"] = measure(
+            lambda: world.Step(1/FS.hz, FS.velocityIterations, FS.positionIterations), duration=duration)
+    return results
+
+
+def bench_reproduction(duration):
+    results = {}
+    for n_connections in (4, 16, 64, 256):
+        podd = Podd(random_podd_genome(n_connections), 0)
+        results[f"reproduction.new_genome[connections={n_connections}]"] = measure(lambda: podd.new_genome(), duration=duration)
+
+    host = BenchWorld()
+    genomes = [random_podd_genome() for _ in range(100)]
+    for genome in genomes:
+        host.add_podd(genome, random_position())
+    # add and remove one podd per op, so the population stays at 100
+    results["reproduction.add_podd[podds=100]"] = measure(
+        lambda genome: host.kill_podd(host.add_podd(genome, random_position())), lambda: random.choice(genomes), duration)
+    results["reproduction.kill_podd[podds=100]"] = measure(
+        lambda id: host.kill_podd(id), lambda: host.add_podd(random.choice(genomes), random_position()), duration)
+    return results
+
+
+COMPONENTS = {
+    "brain": bench_brain,
+    "population": bench_population,
+    "food": bench_food,
+    "physics": bench_physics,
+    "reproduction": bench_reproduction,
+}
+
+
+def run(components=None, duration=1.0, seed=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    streams.seed(seed)
+    results = {}
+    for name in components or COMPONENTS:
+        results.update(COMPONENTS[name](duration))
+    return {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "numpy": np.__version__, "box2d": b2d.__version__, "machine": platform.platform(), "seed": seed},
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''
+    Returns [(case, ops/sec ratio to the baseline, regressed)] for the cases in both runs.
+    '''
+    rows = []
+    for case, result in results["results"].items():
+        if case in baseline["results"]:
+            ratio = result["ops_per_sec"] / baseline["results"][case]["ops_per_sec"]
+            rows.append((case, ratio, ratio < 1 - tolerance))
+    return rows
+
+
+def save(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    unknown = [name for name in args.components if name not in COMPONENTS]
+    if unknown:
+        parser.error(f"unknown components {unknown}, choose from {list(COMPONENTS)}")
+
+    results = run(args.components, args.time, args.seed)
+    print(f"{'case':50} {'ops/s':>12} {'p50 µs':>10} {'p90 µs':>10} {'p99 µs':>10}")
+    for case, r in results["results"].items():
+        print(f"{case:50} {r['ops_per_sec']:12.1f} {r['p50_us']:10.1f} {r['p90_us']:10.1f} {r['p99_us']:10.1f}")
+    save(results, args.out)
+    print(f"Results saved to {args.out}")
+
+    regressed = False
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        print(f"\nCompared to {args.baseline} (ops/s ratio, regression below {1 - args.tolerance:.2f}):")
+        for case, ratio, slower in compare(results, load(args.baseline), args.tolerance):
+            print(f"{case:50} {ratio:8.2f}{'  REGRESSION' if slower else ''}")
+            regressed |= slower
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    sys.exit(1 if regressed else 0)
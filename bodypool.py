@@ -0,0 +1,107 @@
+'''
+Pool of podd bodies.
+
+Dead podds' bodies are deactivated (out of the broadphase and the solver)
+and parked instead of destroyed, and births take a parked body of the same
+shape before creating a new one. Shapes are cached by size bucket: the
+half-width sqrt(size) is rounded to a multiple of WS.shape_bucket, so
+bodies of podds with nearly the same size are interchangeable. When no
+body of the right bucket is parked, the one of the nearest bucket gets its
+fixture swapped for the cached shape, which still saves creating a body.
+'''
+from math import sqrt
+
+import Box2D as b2d
+
+from settings import WorldSettings as WS
+
+PARKING = (1e6, 1e6)  # where parked bodies wait, far outside the world and the view
+
+
+class BodyPool:
+
+    def __init__(self, world, capacity=None, bucket=None):
+        self.world = world
+        self.capacity = WS.body_pool_size if capacity is None else capacity
+        self.bucket = WS.shape_bucket if bucket is None else bucket
+        self.shapes = {}  # {bucket key: b2PolygonShape}
+        self.parked = {}  # {bucket key: [bodies]} (no empty lists), the last parked is reused first
+        self.size = 0  # parked bodies
+        self.serial = 0  # parking order, kept in checkpoints
+        self.hits = 0  # parked bodies reused
+        self.reshapes = 0  # of which with a new fixture
+        self.misses = 0
+
+    def key(self, size):
+        scale = sqrt(size)
+        return round(scale / self.bucket) if self.bucket else scale
+
+    def shape(self, key):
+        shape = self.shapes.get(key)
+        if shape is None:
+            scale = key * self.bucket if self.bucket else key
+            shape = self.shapes[key] = b2d.b2PolygonShape(vertices=[(0, 0), (-scale, -scale), (scale, -scale)])
+        return shape
+
+    def acquire(self, size, position, angle, id):
+        ''' The fixture of a body with the shape for `size`, at rest at position and angle, userData id '''
+        key = self.key(size)
+        if self.parked:
+            parked_key = key if key in self.parked else min(self.parked, key=lambda k: (abs(k - key), k))
+            bodies = self.parked[parked_key]
+            body = bodies.pop()
+            if not bodies:
+                del self.parked[parked_key]
+            if parked_key != key:
+                body.DestroyFixture(body.fixtures[0])
+                body.CreateFixture(shape=self.shape(key), density=WS.test_density, friction=0.3)
+                self.reshapes += 1
+            self.hits += 1
+            self.size -= 1
+            body.transform = (position, angle)
+            body.linearVelocity = (0, 0)
+            body.angularVelocity = 0
+            body.userData = id
+            body.active = True
+            body.awake = True
+            return body.fixtures[0]
+        self.misses += 1
+        return self.create(size, position, angle, id)
+
+    def create(self, size, position, angle, id):
+        ''' Like acquire(), but always a new body: the parked ones are left as they are '''
+        body = self.world.CreateDynamicBody(position=position, angle=angle, angularDamping=5, linearDamping=0.1, userData=id)
+        return body.CreateFixture(shape=self.shape(self.key(size)), density=WS.test_density, friction=0.3)
+
+    def release(self, body, size):
+        ''' Parks the body of a podd of `size`, or destroys it when the pool is full '''
+        if self.size >= self.capacity:
+            self.world.DestroyBody(body)
+            return
+        key = self.key(size)
+        self.park(body, key, self.serial)
+        self.serial += 1
+
+    def park(self, body, key, serial):
+        body.awake = False  # zeroes the force and torque of the dead podd's last moves, or the next podd would get them
+        body.active = False
+        body.transform = (PARKING, 0)
+        body.userData = (key, serial)  # never a podd id, tells capture() which bodies are parked
+        self.parked.setdefault(key, []).append(body)
+        self.size += 1
+
+    def restore(self, key, serial):
+        '''
+        Recreates a parked body from checkpoint.capture()'s "pool" entries.
+        Called in the saved world body order, between the podd bodies.
+        '''
+        body = self.world.CreateDynamicBody(position=PARKING, angularDamping=5, linearDamping=0.1)
+        body.CreateFixture(shape=self.shape(key), density=WS.test_density, friction=0.3)
+        self.park(body, key, serial)
+        self.parked[key].sort(key=lambda body: body.userData[1])
+        self.serial = max(self.serial, serial + 1)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,92 @@
+'''
+Population-wide brain evaluation: every living brain in one NumPy pass.
+'''
+import numpy as np
+
+from settings import BrainSettings as BS
+
+
+class PopulationBrain:
+    '''
+    Evaluates the compiled programs of many Brains together.
+
+    All brains are laid out back to back in one value buffer and their edges
+    are merged into one sparse (COO, sorted by layer) program. Layer l of the
+    population holds layer l of every brain, so a frame costs one gather,
+    multiply and bincount per layer instead of one Python call per podd.
+
+    Brains are registered under a key (podd id). The row order of the input and
+    action matrices is `order`, which is rebuilt lazily after adds/removes.
+    '''
+
+    def __init__(self):
+        self.brains = {}  # {key: Brain}
+        self._rebuild()
+
+    def add(self, key, brain):
+        self.brains[key] = brain
+        self.dirty = True
+
+    def remove(self, key):
+        if self.brains.pop(key, None) is not None:
+            self.dirty = True
+
+    def __len__(self):
+        return len(self.brains)
+
+    @property
+    def order(self):
+        ''' Keys of the registered brains, in the row order used by compute '''
+        if self.dirty:
+            self._rebuild()
+        return self._order
+
+    @property
+    def inputs(self):
+        ''' Preallocated (len(order), BS.n_inputs) input matrix, can be filled in place and passed to compute '''
+        if self.dirty:
+            self._rebuild()
+        return self._inputs
+
+    def _rebuild(self):
+        self._order = list(self.brains)
+        brains = [self.brains[key] for key in self._order]
+        n_nodes = np.array([brain.values.size for brain in brains], dtype=np.intp)
+        offsets = np.cumsum(n_nodes) - n_nodes
+        self.values = np.zeros(n_nodes.sum())
+        self._inputs = np.zeros((len(brains), BS.n_inputs))
+        self.input_index = offsets[:, None] + np.arange(BS.n_inputs)
+        if brains:
+            self.output_index = offsets[:, None] + np.stack([brain.output_index for brain in brains])
+            edge_offsets = np.repeat(offsets, [brain.edge_src.size for brain in brains])
+            src = np.concatenate([brain.edge_src for brain in brains]) + edge_offsets
+            tgt = np.concatenate([brain.edge_tgt for brain in brains]) + edge_offsets
+            weight = np.concatenate([brain.edge_weight for brain in brains])
+            layer = np.concatenate([brain.edge_layer for brain in brains])
+        else:
+            self.output_index = np.zeros((0, BS.n_outputs), dtype=np.intp)
+            src = tgt = layer = np.zeros(0, dtype=np.intp)
+            weight = np.zeros(0)
+
+        # split the merged edge list into layers, each layer as (sources, weights, target rows, targets)
+        by_layer = np.argsort(layer, kind="stable")
+        src, tgt, weight, layer = src[by_layer], tgt[by_layer], weight[by_layer], layer[by_layer]
+        bounds = np.searchsorted(layer, np.arange(layer.max() + 2 if layer.size else 1))
+        self.layers = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            targets, rows = np.unique(tgt[start:stop], return_inverse=True)
+            self.layers.append((src[start:stop], weight[start:stop], rows, targets))
+        self.dirty = False
+
+    def compute(self, inputs):
+        '''
+        inputs: (len(order), BS.n_inputs) matrix of observations, one row per brain in `order`
+        returns: (len(order), BS.n_outputs) matrix of raw brain outputs
+        '''
+        if self.dirty:
+            self._rebuild()
+        values = self.values
+        values[self.input_index] = inputs
+        for src, weight, rows, targets in self.layers:
+            values[targets] = np.maximum(np.bincount(rows, values[src] * weight, minlength=targets.size), 0)
+        return values[self.output_index]
@@ -0,0 +1,114 @@
+'''
+Checkpoint and resume of the full SimWorld state.
+
+capture() copies the state on the simulation thread (a few array copies),
+the Checkpointer pickles, compresses and writes it on a background thread.
+Files are replaced atomically, so a crash mid-write leaves the previous
+checkpoint intact.
+'''
+import os
+import pickle
+import queue
+import random
+import threading
+import zlib
+import numpy as np
+
+from rng import streams
+from utils import get_logger
+
+logger = get_logger(__name__, "WORLD")
+
+MAGIC = b"EVOSIMCK"
+VERSION = 1
+
+
+def capture(world):
+    '''
+    Snapshot of everything needed to rebuild `world`: frame counters, food,
+    podds (genome, lineage, store slot), the podd store columns, the Box2D
+    body states in world body order (with the bodies parked in the body
+    pool) and the RNG states.
+    '''
+    store = world.store
+    bodies = []
+    pool = []
+    for body in world.world.bodies:
+        if body.userData in world.podds:
+            bodies.append((body.userData, *body.position, body.angle, *body.linearVelocity, body.angularVelocity, body.awake))
+        elif isinstance(body.userData, tuple):  # parked: (shape key, serial)
+            bodies.append((-1, 0, 0, 0, 0, 0, 0, False))
+            pool.append(body.userData)
+    return {
+        "version": VERSION,
+        "frame_counter": world.frame_counter,
+        "spawn_food_counter": world.spawn_food_counter,
+        "next_id": world.next_id,
+        "step_count": world.stepCount,
+        "food": np.array(list(world.food), dtype=float).reshape(-1, 2),
+        # in world.podds order, genomes are never modified after birth, children lists are
+        "podds": [(podd.id, podd.parent, list(podd.children), podd.genome, podd.slot) for _, podd in world.podds.values()],
+        "brain_order": list(world.brains.order),
+        "store": {
+            "capacity": store.capacity,
+            "free": list(store.free),
+            "previous_action": store.previous_action.copy(),
+            **{name: getattr(store, name).copy() for name in store.columns},
+        },
+        "bodies": np.array(bodies, dtype=float).reshape(-1, 8),  # id, x, y, angle, vx, vy, w, awake (id -1: parked)
+        "pool": pool,  # (shape key, serial) of the parked bodies, in the order of their rows
+        "random_state": random.getstate(),
+        "np_random_state": np.random.get_state(),
+        "rng_state": streams.get_state(),
+    }
+
+
+def write(state, path, level=6):
+    data = zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), level)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + VERSION.to_bytes(2, "little") + data)
+    os.replace(tmp_path, path)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an EvoSim checkpoint")
+    version = int.from_bytes(data[len(MAGIC):len(MAGIC) + 2], "little")
+    if version != VERSION:
+        raise ValueError(f"Unsupported checkpoint version {version} in {path}")
+    return pickle.loads(zlib.decompress(data[len(MAGIC) + 2:]))
+
+
+class Checkpointer:
+    '''
+    Writes checkpoints on a background thread. If the previous checkpoint is
+    still being written, save() waits for it rather than queueing snapshots
+    without bound.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+        self.thread.start()
+
+    def save(self, world):
+        self.queue.put(capture(world))
+
+    def _run(self):
+        while True:
+            state = self.queue.get()
+            if state is None:
+                break
+            try:
+                write(state, self.path)
+                logger.info("Checkpoint written: frame %s to %s", state["frame_counter"], self.path)
+            except Exception:
+                logger.exception("Checkpoint failed")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,55 @@
+'''
+Contact recording for the framework.
+
+Contact points (drawn with drawContactPoints/drawContactNormals) go into
+preallocated arrays of at most maxContactPoints rows instead of one dict
+per manifold point. Begin/end events between bodies that carry userData
+(the podds) are collected during the step and handed out as one batch.
+'''
+import numpy as np
+
+
+class ContactRecorder:
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.position = np.zeros((capacity, 2))
+        self.normal = np.zeros((capacity, 2))
+        self.state = np.zeros(capacity, dtype=np.int8)  # b2PointState of the point in the new manifold
+        self.count = 0
+        self.began = []  # [(userData A, userData B)] since the last take_events
+        self.ended = []
+
+    def clear_points(self):
+        self.count = 0
+
+    def add_points(self, world_manifold, states):
+        ''' Records the points of one manifold, as far as there is room '''
+        count = self.count
+        n = min(len(states), self.capacity - count)
+        if n <= 0:
+            return
+        normal = tuple(world_manifold.normal)
+        points = world_manifold.points
+        for i in range(n):
+            self.position[count + i] = points[i]
+            self.normal[count + i] = normal
+            self.state[count + i] = states[i]
+        self.count = count + n
+
+    def points(self):
+        ''' (positions, normals, states) of the points recorded this step '''
+        return self.position[:self.count], self.normal[:self.count], self.state[:self.count]
+
+    def add_event(self, contact, began):
+        a, b = contact.fixtureA.body.userData, contact.fixtureB.body.userData
+        if a is None or b is None:
+            return
+        (self.began if began else self.ended).append((a, b))
+
+    def take_events(self):
+        ''' (began, ended) as (n, 2) arrays of userData pairs, cleared for the next frame '''
+        began = np.array(self.began, dtype=np.int64).reshape(-1, 2)
+        ended = np.array(self.ended, dtype=np.int64).reshape(-1, 2)
+        self.began, self.ended = [], []
+        return began, ended
@@ -1,3 +1,5 @@
+import sys
+import threading
 from time import time
 
 from Box2D import (b2World, b2AABB, b2CircleShape, b2Color, b2Vec2)
@@ -6,7 +8,9 @@ from Box2D import (b2Fixture, b2FixtureDef, b2Joint)
 from Box2D import (b2GetPointStates, b2QueryCallback, b2Random)
 from Box2D import (b2_addState, b2_dynamicBody, b2_epsilon, b2_persistState)
 
-from settings import FrameworkSettings as FS
+from contacts import ContactRecorder
+from metrics import FrameTimer
+from settings import FrameworkSettings as FS, OutputSettings as OS
 
 class fwDestructionListener(b2DestructionListener):
     """
@@ -81,7 +85,8 @@ class FrameworkBase(b2ContactListener):
         """ Reset all of the variables to their starting values.
         Not to be called except at initialization."""
         # Box2D-related
-        self.points = []
+        self.contacts = ContactRecorder(FS.maxContactPoints)
+        self.recording_points = False
         self.world = None
         self.bomb = None
         self.mouseJoint = None
@@ -106,8 +111,9 @@ class FrameworkBase(b2ContactListener):
 
         self.destructionListener = fwDestructionListener(test=self)
         self.world.destructionListener = self.destructionListener
-        self.world.contactListener = self
+        self.world.contactListener = None  # registered by UpdateContactListener when something consumes contacts
         self.t_steps, self.t_draws = [], []
+        self.timer = FrameTimer(OS.metrics_window)  # per-phase frame timings, see metrics.py
 
     def __del__(self):
         pass
@@ -136,7 +142,8 @@ class FrameworkBase(b2ContactListener):
             else:
                 timeStep = 0.0
 
-            self.Print("****PAUSED****", (200, 0, 0))
+            if renderer:
+                self.Print("****PAUSED****", (200, 0, 0))
 
         # Set the flags based on what the settings show
         if renderer:
@@ -158,7 +165,8 @@ class FrameworkBase(b2ContactListener):
         self.world.subStepping = settings.enableSubStepping
 
         # Reset the collision points
-        self.points = []
+        self.UpdateContactListener()
+        self.contacts.clear_points()
 
         # Tell Box2D to step
         t_step = time()
@@ -166,6 +174,9 @@ class FrameworkBase(b2ContactListener):
                         settings.positionIterations)
         self.world.ClearForces()
         t_step = time() - t_step
+        if self.using_contacts:
+            self.ContactEvents(*self.contacts.take_events())
+        self.timer.mark("physics")
 
         # Update the debug draw settings so that the vertices will be properly
         # converted to screen coordinates
@@ -173,8 +184,7 @@ class FrameworkBase(b2ContactListener):
 
         if renderer is not None:
             renderer.StartDraw()
-
-        self.world.DrawDebugData()
+            self.DrawWorld()
 
         # If the bomb is frozen, get rid of it.
         if self.bomb and not self.bomb.awake:
@@ -206,21 +216,22 @@ class FrameworkBase(b2ContactListener):
                                      self.colors['bomb_line'])
 
             # Draw each of the contact points in different colors.
+            positions, normals, states = self.contacts.points()
             if self.settings.drawContactPoints:
-                for point in self.points:
-                    if point['state'] == b2_addState:
-                        renderer.DrawPoint(renderer.to_screen(point['position']),
+                for position, state in zip(positions.tolist(), states.tolist()):
+                    if state == b2_addState:
+                        renderer.DrawPoint(renderer.to_screen(position),
                                            settings.pointSize,
                                            self.colors['contact_add'])
-                    elif point['state'] == b2_persistState:
-                        renderer.DrawPoint(renderer.to_screen(point['position']),
+                    elif state == b2_persistState:
+                        renderer.DrawPoint(renderer.to_screen(position),
                                            settings.pointSize,
                                            self.colors['contact_persist'])
 
             if settings.drawContactNormals:
-                for point in self.points:
-                    p1 = renderer.to_screen(point['position'])
-                    p2 = renderer.axisScale * point['normal'] + p1
+                for position, normal in zip(positions.tolist(), normals.tolist()):
+                    p1 = renderer.to_screen(position)
+                    p2 = renderer.axisScale * b2Vec2(*normal) + p1
                     renderer.DrawSegment(p1, p2, self.colors['contact_normal'])
 
             renderer.EndDraw()
@@ -263,6 +274,89 @@ class FrameworkBase(b2ContactListener):
                                      sum(self.t_steps) / len(self.t_steps))
                                )
 
+        self.timer.mark("draw")
+
+    def DrawWorld(self):
+        """
+        Draws the bodies of the world, once per step when there is a renderer.
+        Override to draw them another way than through the debug draw.
+        """
+        self.world.DrawDebugData()
+
+    def Snapshot(self):
+        """
+        Returns a copy of what the viewer draws, taken on the simulation
+        thread in decoupled mode. Must not share mutable state with the world.
+        """
+        return None
+
+    def DrawSnapshot(self, previous, latest, alpha):
+        """
+        Draws in decoupled mode: the state `alpha` (0 to 1) of the way from
+        the previous snapshot to the latest one. previous may be None.
+        """
+        raise NotImplementedError()
+
+    def Shutdown(self):
+        """
+        Called once when the main loop ends, also if it ends with an exception.
+        Flush and close any outputs here.
+        """
+        pass
+
+    def StopCondition(self):
+        """
+        Checked after every step of a headless run. Return True to end the run
+        early (eg. when the population has gone extinct).
+        """
+        return False
+
+    def run_headless(self, frames=None, time_limit=None, report_interval=None):
+        """
+        Steps the world as fast as the CPU allows, without rendering or
+        frame throttling.
+
+        Stops after `frames` steps, after `time_limit` wall-clock seconds or
+        when StopCondition() returns True, whichever comes first. Prints the
+        step rate every `report_interval` seconds.
+
+        Returns a dict with the number of steps, the elapsed time and the
+        average steps per second.
+        """
+        frames = self.settings.headless_frames if frames is None else frames
+        time_limit = self.settings.headless_time_limit if time_limit is None else time_limit
+        report_interval = self.settings.headless_report_interval if report_interval is None else report_interval
+
+        steps = 0
+        t_start = t_report = time()
+        steps_report = 0
+        reason = "frames"
+        try:
+            while frames is None or steps < frames:
+                self.Step(self.settings)
+                steps += 1
+                t_now = time()
+                if self.StopCondition():
+                    reason = "stop_condition"
+                    break
+                if time_limit is not None and t_now - t_start >= time_limit:
+                    reason = "time_limit"
+                    break
+                if report_interval and t_now - t_report >= report_interval:
+                    print("Step rate: %.2f steps/s (%d steps)" %
+                          ((steps - steps_report) / (t_now - t_report), steps))
+                    t_report, steps_report = t_now, steps
+        finally:
+            self.Shutdown()
+
+        elapsed = max(b2_epsilon, time() - t_start)
+        print("Headless run finished (%s): %d steps in %.2fs, %.2f steps/s" %
+              (reason, steps, elapsed, steps / elapsed))
+
+        self.world.contactListener = None
+        self.world.destructionListener = None
+        return {"steps": steps, "elapsed": elapsed, "steps_per_sec": steps / elapsed, "reason": reason}
+
     def ShiftMouseDown(self, p):
         """
         Indicates that there was a left click at point p (world coordinates)
@@ -417,10 +511,8 @@ class FrameworkBase(b2ContactListener):
         This is a critical function when there are many contacts in the world.
         It should be optimized as much as possible.
         """
-        if not (self.settings.drawContactPoints or
-                self.settings.drawContactNormals or self.using_contacts):
-            return
-        elif len(self.points) > self.settings.maxContactPoints:
+        contacts = self.contacts
+        if not self.recording_points or contacts.count >= contacts.capacity:
             return
 
         manifold = contact.manifold
@@ -431,24 +523,37 @@ class FrameworkBase(b2ContactListener):
         if not state2:
             return
 
-        worldManifold = contact.worldManifold
+        contacts.add_points(contact.worldManifold, state2)
 
-        # TODO: find some way to speed all of this up.
-        self.points.extend([dict(fixtureA=contact.fixtureA,
-                                 fixtureB=contact.fixtureB,
-                                 position=worldManifold.points[i],
-                                 normal=worldManifold.normal.copy(),
-                                 state=state2[i],
-                                 )
-                            for i, point in enumerate(state2)])
+    def UpdateContactListener(self):
+        """
+        Registers this object as the contact listener only while something
+        consumes contacts: drawn contact points/normals or using_contacts.
+        Otherwise Box2D runs no Python callback per contact at all.
+        """
+        settings = self.settings
+        self.recording_points = self.renderer is not None and (settings.drawContactPoints or settings.drawContactNormals)
+        listener = self if (self.recording_points or self.using_contacts) else None
+        if self.world.contactListener is not listener:
+            self.world.contactListener = listener
+
+    def ContactEvents(self, began, ended):
+        """
+        Called once per step with using_contacts set: the contacts that began
+        and ended during the step between bodies with (integer) userData, as
+        (n, 2) arrays of userData pairs.
+        """
+        pass
 
     # These can/should be implemented in the test subclass: (Step() also if necessary)
     # See empty.py for a simple example.
     def BeginContact(self, contact):
-        pass
+        if self.using_contacts:
+            self.contacts.add_event(contact, True)
 
     def EndContact(self, contact):
-        pass
+        if self.using_contacts:
+            self.contacts.add_event(contact, False)
 
     def PostSolve(self, contact, impulse):
         pass
@@ -478,14 +583,20 @@ class FrameworkBase(b2ContactListener):
         pass
 
 
-def main(test_class):
+def main(test_class, *args):
     """
-    Loads the test class and executes it.
+    Loads the test class and executes it. args are passed to the test class.
     """
     print("Loading %s..." % test_class.name)
-    test = test_class()
+    test = test_class(*args)
     if FS.onlyInit:
         return
+    if FS.headless:
+        test.run_headless()
+        return
+    if FS.decoupled:
+        test.run_decoupled()
+        return
     test.run()
 
 # from __future__ import (print_function, absolute_import, division)
@@ -494,6 +605,7 @@ import pygame
 from pygame.locals import (QUIT, KEYDOWN, KEYUP, MOUSEBUTTONDOWN,
                            MOUSEBUTTONUP, MOUSEMOTION, KMOD_LSHIFT)
 
+argv, sys.argv = sys.argv, sys.argv[:1]  # the GUI imports Box2D's testbed settings, which parse sys.argv with optparse
 try:
     from Box2D.examples.backends.pygame_gui import (fwGUI, gui)
     GUIEnabled = True
@@ -501,6 +613,8 @@ except Exception as ex:
     print('Unable to load PGU; menu disabled.')
     print('(%s) %s' % (ex.__class__.__name__, ex))
     GUIEnabled = False
+finally:
+    sys.argv = argv
 
 class PygameDraw(b2DrawExtended):
     """
@@ -672,7 +786,7 @@ class CustomFramework(FrameworkBase):
         super(CustomFramework, self).__init__()
 
         self.__reset()
-        if FS.onlyInit:  # testing mode doesn't initialize pygame
+        if FS.onlyInit or FS.headless:  # testing and headless modes don't initialize pygame
             return
 
         print('Initializing pygame framework...')
@@ -795,28 +909,142 @@ class CustomFramework(FrameworkBase):
 
         running = True
         clock = pygame.time.Clock()
-        while running:
-            running = self.checkEvents()
-            self.screen.fill((0, 0, 0))
+        try:
+            while running:
+                running = self.checkEvents()
+                self.screen.fill((0, 0, 0))
 
-            # Check keys that should be checked every loop (not only on initial
-            # keydown)
-            self.CheckKeys()
+                # Check keys that should be checked every loop (not only on initial
+                # keydown)
+                self.CheckKeys()
 
-            # Run the simulation loop
-            self.SimulationLoop()
+                # Run the simulation loop
+                self.SimulationLoop()
 
-            if GUIEnabled and self.settings.drawMenu:
-                self.gui_app.paint(self.screen)
+                if GUIEnabled and self.settings.drawMenu:
+                    self.gui_app.paint(self.screen)
 
-            pygame.display.flip()
-            clock.tick(self.settings.hz)
-            self.fps = clock.get_fps()
+                pygame.display.flip()
+                clock.tick(self.settings.hz)
+                self.fps = clock.get_fps()
+        finally:
+            self.Shutdown()
 
         self.world.contactListener = None
         self.world.destructionListener = None
         self.world.renderer = None
 
+    def run_decoupled(self, speed=None, fps=None):
+        """
+        Main loop with the simulation on its own thread.
+
+        The simulation steps at `speed` times real time (0: as fast as it can)
+        and publishes a Snapshot() whenever the viewer has taken the previous
+        one. This thread renders at `fps`, interpolating between the last two
+        snapshots, so a slow render never stalls the simulation and watching
+        never throttles it. Only the view (zoom, pan) can be changed: mouse
+        joints, bombs and the settings menu would touch the world from this
+        thread.
+        """
+        speed = self.settings.sim_speed if speed is None else speed
+        fps = self.settings.render_fps if fps is None else fps
+
+        renderer, gui_table = self.renderer, self.gui_table
+        self.renderer = self.world.renderer = None  # the simulation thread steps without drawing
+        self.gui_table = None
+        self.snapshots = (None, None)  # (previous, latest), each (publish time, snapshot)
+        self.snapshot_wanted = threading.Event()
+        self.snapshot_wanted.set()
+        self.sim_rate = 0.0
+        stop = threading.Event()
+        errors = []
+        sim = threading.Thread(target=self._simulate, args=(speed, stop, errors), name="simulation", daemon=True)
+
+        clock = pygame.time.Clock()
+        sim.start()
+        try:
+            while sim.is_alive() and self.checkViewerEvents():
+                self.CheckKeys()
+                self.screen.fill((0, 0, 0))
+                self.textLine = self.TEXTLINE_START
+                self.Print(self.name, (127, 127, 255))
+                previous, latest = self.snapshots
+                if latest is not None:
+                    alpha = 1.0
+                    if previous is not None and latest[0] > previous[0]:
+                        alpha = min(1.0, (time() - latest[0]) / (latest[0] - previous[0]))
+                    self.DrawSnapshot(previous and previous[1], latest[1], alpha)
+                    self.snapshot_wanted.set()
+                self.Print("Simulation %.1f steps/s (x%.1f real time), render %.1f fps" %
+                           (self.sim_rate, self.sim_rate / self.settings.hz, clock.get_fps()))
+                pygame.display.flip()
+                clock.tick(fps)
+        finally:
+            stop.set()
+            sim.join()
+            self.renderer, self.gui_table = renderer, gui_table
+            self.world.renderer = renderer
+            self.Shutdown()
+        if errors:
+            raise errors[0]
+
+    def _simulate(self, speed, stop, errors):
+        """ Simulation thread of run_decoupled """
+        step_time = 1.0 / (self.settings.hz * speed) if speed else 0.0
+        t_next = t_rate = time()
+        steps_rate = 0
+        try:
+            while not stop.is_set():
+                self.Step(self.settings)
+                steps_rate += 1
+                if self.snapshot_wanted.is_set():
+                    self.snapshot_wanted.clear()
+                    self.snapshots = (self.snapshots[1], (time(), self.Snapshot()))
+                if self.StopCondition():
+                    print("Simulation stopped (stop_condition) at step %d" % self.stepCount)
+                    break
+                t_now = time()
+                if t_now - t_rate >= 1.0:
+                    self.sim_rate = steps_rate / (t_now - t_rate)
+                    t_rate, steps_rate = t_now, 0
+                if step_time:
+                    t_next += step_time
+                    if t_next > t_now:
+                        stop.wait(t_next - t_now)
+                    elif t_now - t_next > 0.25:
+                        t_next = t_now  # fell behind: carry on from now rather than catch up in a burst
+        except Exception as e:
+            errors.append(e)
+
+    def checkViewerEvents(self):
+        """
+        The view-only part of checkEvents, for run_decoupled. Other keys
+        go to Keyboard(), called from the render thread.
+        """
+        for event in pygame.event.get():
+            if event.type == QUIT or (event.type == KEYDOWN and event.key == Keys.K_ESCAPE):
+                return False
+            elif event.type == KEYDOWN:
+                if event.key == Keys.K_z:
+                    self.viewZoom = min(1.1 * self.viewZoom, 50.0)
+                elif event.key == Keys.K_x:
+                    self.viewZoom = max(0.9 * self.viewZoom, 0.02)
+                else:
+                    self.Keyboard(event.key)
+            elif event.type == MOUSEBUTTONDOWN:
+                if event.button == 3:
+                    self.rMouseDown = True
+                elif event.button == 4:
+                    self.viewZoom *= 1.1
+                elif event.button == 5:
+                    self.viewZoom /= 1.1
+            elif event.type == MOUSEBUTTONUP:
+                if event.button == 3:
+                    self.rMouseDown = False
+            elif event.type == MOUSEMOTION and self.rMouseDown:
+                self.viewCenter -= (event.rel[0] / 5.0, -event.rel[1] / 5.0)
+        return True
+
     def _Keyboard_Event(self, key, down=True):
         """
         Internal keyboard event, don't override this.
@@ -865,13 +1093,13 @@ class CustomFramework(FrameworkBase):
             self.viewCenter = (0.0, 20.0)
 
     def Step(self, settings):
-        if GUIEnabled:
+        if GUIEnabled and self.gui_table:
             # Update the settings based on the GUI
             self.gui_table.updateSettings(self.settings)
 
         super(CustomFramework, self).Step(settings)
 
-        if GUIEnabled:
+        if GUIEnabled and self.gui_table:
             # In case during the step the settings changed, update the GUI reflecting
             # those settings.
             self.gui_table.updateGUI(self.settings)
@@ -913,12 +1141,18 @@ class CustomFramework(FrameworkBase):
         """
         pass
 
-def main(test_class):
+def main(test_class, *args):
     """
-    Loads the test class and executes it.
+    Loads the test class and executes it. args are passed to the test class.
     """
     print("Loading %s..." % test_class.name)
-    test = test_class()
+    test = test_class(*args)
     if FS.onlyInit:
         return
+    if FS.headless:
+        test.run_headless()
+        return
+    if FS.decoupled:
+        test.run_decoupled()
+        return
     test.run()
\ No newline at end of file
@@ -0,0 +1,135 @@
+'''
+Runs many headless SimWorld replicates across a process pool.
+
+Every run gets its own seed, settings overrides and output directory
+(history, census and log file). The per-run histories are merged into one
+ensemble_history file in the ensemble output directory.
+
+python ensemble.py --runs 16 --frames 36000 --set WorldSettings.init_podds=20
+'''
+import argparse
+import multiprocessing as mp
+import os
+import random
+import time
+
+import settings
+from sinks import open_sink, read_records
+
+
+def apply_overrides(overrides):
+    '''
+    overrides: {"WorldSettings": {"init_food": 300}, ...}, applied to the settings classes
+    '''
+    for cls_name, values in overrides.items():
+        cls = getattr(settings, cls_name)
+        for attr, value in values.items():
+            if not hasattr(cls, attr):
+                raise AttributeError(f"{cls_name} has no setting {attr}")
+            setattr(cls, attr, value)
+
+
+def prepare_run(config):
+    '''
+    Applies a run config (overrides, output directory, seed) to this
+    process. Must be called in a fresh process, before the world module is
+    imported.
+    '''
+    os.makedirs(config["output_dir"], exist_ok=True)
+    apply_overrides(config.get("overrides", {}))
+    settings.FrameworkSettings.headless = True
+    settings.FrameworkSettings.headless_report_interval = 0
+    settings.OutputSettings.directory = config["output_dir"]
+    settings.LogSettings.log_file = os.path.join(config["output_dir"], "evosim.log")
+    settings.LogSettings.console = False
+
+    random.seed(config["seed"])
+    import numpy as np
+    np.random.seed(config["seed"] % 2**32)
+
+
+def run_one(config):
+    ''' Runs one headless SimWorld in this (fresh) process '''
+    prepare_run(config)
+    from world import SimWorld
+
+    world = SimWorld()
+    result = world.run_headless(frames=config.get("frames"), time_limit=config.get("time_limit"))
+    columns, rows = read_records("history", settings.OutputSettings.backend, config["output_dir"])
+    result.update(run=config["run"], seed=config["seed"], output_dir=config["output_dir"],
+                  population=len(world.podds), columns=columns, history=rows)
+    return result
+
+
+def run_ensemble(runs, frames=None, time_limit=None, processes=None, seed=0, overrides=None,
+                 run_overrides=None, output_dir="ensemble"):
+    '''
+    Runs `runs` replicates, seeded seed, seed+1, ..., on a pool of `processes`
+    workers (default: all cores). `overrides` apply to every run,
+    run_overrides[i] (if given) on top of them for run i.
+    Returns the per-run results, in run order.
+    '''
+    configs = []
+    for i in range(runs):
+        run_settings = {cls_name: dict(values) for cls_name, values in (overrides or {}).items()}
+        for cls_name, values in (run_overrides[i] if run_overrides else {}).items():
+            run_settings.setdefault(cls_name, {}).update(values)
+        configs.append({"run": i, "seed": seed + i, "frames": frames, "time_limit": time_limit, "overrides": run_settings,
+                        "output_dir": os.path.join(output_dir, f"run{i:03}")})
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    t_start = time.time()
+    # spawn, one run per worker: every run starts from a fresh interpreter so overrides and seeds apply
+    # before import (a reused worker would keep the previous run's settings, world module and log file)
+    with mp.get_context("spawn").Pool(processes, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(run_one, configs):
+            results.append(result)
+            print(f"[{len(results)}/{runs}] run {result['run']} (seed {result['seed']}) finished ({result['reason']}): "
+                  f"{result['steps']} steps at {result['steps_per_sec']:.0f} steps/s, population {result['population']} "
+                  f"| {time.time() - t_start:.1f}s elapsed")
+    results.sort(key=lambda result: result["run"])
+    merge_histories(results, output_dir)
+    return results
+
+
+def merge_histories(results, output_dir, name="ensemble_history", key="run"):
+    ''' Writes every run's history into one `name` file, tagged with result[key] and the seed '''
+    if not results:
+        return
+    merged = open_sink(name, [key, "seed"] + results[0]["columns"], settings.OutputSettings.backend, output_dir)
+    for result in results:
+        for row in result["history"]:
+            merged.write(result[key], result["seed"], *row)
+    merged.close()
+
+
+def parse_override(text):
+    ''' "WorldSettings.init_food=300" -> ("WorldSettings", "init_food", 300) '''
+    key, value = text.split("=", 1)
+    cls_name, attr = key.split(".", 1)
+    try:
+        value = eval(value, {})  # numbers, booleans, None, tuples...
+    except Exception:
+        pass  # plain string
+    return cls_name, attr, value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many headless EvoSim worlds in parallel")
+    parser.add_argument("--runs", type=int, default=mp.cpu_count(), help="number of replicates")
+    parser.add_argument("--frames", type=int, default=None, help="stop each run after this many frames")
+    parser.add_argument("--time-limit", type=float, default=None, help="stop each run after this many wall-clock seconds")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run, run i uses seed+i")
+    parser.add_argument("--out", default="ensemble", help="output directory")
+    parser.add_argument("--set", action="append", default=[], metavar="Class.attr=value", help="settings override for every run")
+    args = parser.parse_args()
+    if args.frames is None and args.time_limit is None:
+        parser.error("give --frames and/or --time-limit")
+
+    overrides = {}
+    for text in args.set:
+        cls_name, attr, value = parse_override(text)
+        overrides.setdefault(cls_name, {})[attr] = value
+    run_ensemble(args.runs, args.frames, args.time_limit, args.processes, args.seed, overrides, output_dir=args.out)
@@ -0,0 +1,170 @@
+'''
+Compact brain genome: the connections as parallel arrays of integer node
+keys (source, target) and weights, instead of a {"src-tgt": weight} dict.
+
+Node names are interned to integer keys: hidden nodes "0423" -> 423,
+inputs "i0005" -> INPUT_BASE + 5, outputs "o0002" -> OUTPUT_BASE + 2. Names
+in any other format get a key of their own from OTHER_BASE up, so the
+conversion to and from the dict format is always lossless (those keys
+are only valid within the process).
+'''
+import threading
+
+import numpy as np
+
+from rng import streams
+from settings import BrainSettings as BS
+
+INPUT_BASE = 1000000
+OUTPUT_BASE = 2000000
+OTHER_BASE = 3000000
+
+_keys = {}  # {node name: key}
+_names = {}  # {key: node name}
+_others = 0  # keys given out from OTHER_BASE
+_lock = threading.Lock()  # the tables are also filled from the sink and log threads (genome reprs)
+
+
+def _format(key):
+    if key >= OUTPUT_BASE:
+        return f"o{key - OUTPUT_BASE:04}"
+    if key >= INPUT_BASE:
+        return f"i{key - INPUT_BASE:04}"
+    return str(key).zfill(len(str(BS.max_node)))
+
+
+def node_key(name):
+    global _others
+    key = _keys.get(name)
+    if key is not None:
+        return key
+    with _lock:
+        key = _keys.get(name)  # interned by another thread meanwhile
+        if key is None:
+            try:
+                key = INPUT_BASE + int(name[1:]) if name[0] == "i" else OUTPUT_BASE + int(name[1:]) if name[0] == "o" else int(name)
+            except ValueError:
+                key = None
+            if key is None or not 0 <= key < OTHER_BASE or _format(key) != name:
+                key = OTHER_BASE + _others
+                _others += 1
+            _keys[name] = key
+            _names[key] = name
+    return key
+
+
+def node_name(key):
+    name = _names.get(key)
+    if name is not None:
+        return name
+    with _lock:
+        name = _names.get(key)
+        if name is None:
+            name = _names[key] = _format(key)
+            _keys[name] = key
+    return name
+
+
+def input_keys(n=None):
+    return np.arange(INPUT_BASE, INPUT_BASE + (BS.n_inputs if n is None else n), dtype=np.int64)
+
+
+def output_keys(n=None):
+    return np.arange(OUTPUT_BASE, OUTPUT_BASE + (BS.n_outputs if n is None else n), dtype=np.int64)
+
+
+def is_hidden(keys):
+    return (keys < INPUT_BASE) | (keys >= OTHER_BASE)
+
+
+class BrainGenome:
+    '''
+    Connections in insertion order (new ones are appended), so converting a
+    dict to a BrainGenome and back gives the same dict, in the same order.
+
+    Reads like the dict it replaces where the code needs it: items(), len()
+    and repr() (so census records keep the dict format).
+    '''
+    __slots__ = ("src", "tgt", "weight")
+
+    def __init__(self, src=(), tgt=(), weight=()):
+        self.src = np.asarray(src, dtype=np.int64)
+        self.tgt = np.asarray(tgt, dtype=np.int64)
+        self.weight = np.asarray(weight, dtype=float)
+
+    @classmethod
+    def from_dict(cls, genome):
+        pairs = [connection.split("-") for connection in genome]
+        return cls([node_key(src) for src, _ in pairs], [node_key(tgt) for _, tgt in pairs], list(genome.values()))
+
+    @classmethod
+    def coerce(cls, genome):
+        ''' genome as a BrainGenome, converted if it is in the dict format '''
+        return genome if isinstance(genome, cls) else cls.from_dict(genome)
+
+    def to_dict(self):
+        return {f"{node_name(src)}-{node_name(tgt)}": weight
+                for src, tgt, weight in zip(self.src.tolist(), self.tgt.tolist(), self.weight.tolist())}
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __len__(self):
+        return len(self.weight)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def __eq__(self, other):
+        if not isinstance(other, BrainGenome):
+            return NotImplemented
+        return np.array_equal(self.src, other.src) and np.array_equal(self.tgt, other.tgt) and np.array_equal(self.weight, other.weight)
+
+    def topology_key(self):
+        ''' The connections (not the weights) in their order, as a hashable key '''
+        return self.src.tobytes() + self.tgt.tobytes()
+
+    def mutate(self, rng=None):
+        '''
+        Child genome: every connection is deleted with chance BS.chance_del,
+        the others get their weight jittered (by a factor of N(1, BS.mut_sd),
+        or plus BS.min_mut_weight*N(0, BS.mut_sd) when it is too small for a
+        factor to move it). With chance BS.chance_new a connection to or from
+        a new hidden node is added.
+        rng: the rng.Stream to draw from, default the mutation stream
+        '''
+        rng = streams.mutation if rng is None else rng
+        n = len(self.weight)
+        keep = rng.random(n) > BS.chance_del
+        src, tgt, weight = self.src[keep], self.tgt[keep], self.weight[keep]
+        noise = rng.normal(0, BS.mut_sd, len(weight))
+        weight = np.where(np.abs(weight) > BS.min_mut_weight, weight * (1 + noise), weight + BS.min_mut_weight * noise)
+        if rng.random() < BS.chance_new:
+            src, tgt, weight = self._new_connection(src, tgt, weight, rng)
+        return BrainGenome(src, tgt, weight)
+
+    def _new_connection(self, src, tgt, weight, rng):
+        ''' Adds a random connection between the parent's nodes and a new hidden node '''
+        nodes = np.unique(np.concatenate((self.src, self.tgt)))
+        hidden = nodes[is_hidden(nodes)]
+        inputs, outputs = input_keys(), output_keys()
+        if len(hidden) + len(inputs) + len(outputs) >= BS.max_node:
+            raise Exception(f"Too many nodes. nodelist too close to maximum capacity: {len(hidden) + len(inputs) + len(outputs)}/{BS.max_node}")
+        used = set(hidden.tolist())
+        new_node = rng.integers(BS.max_node + 1)
+        while new_node in used:
+            new_node = rng.integers(BS.max_node + 1)
+
+        from_nodes = np.concatenate((inputs, hidden, [new_node]))
+        from_node = from_nodes[rng.integers(len(from_nodes))]
+        to_nodes = np.concatenate((hidden, outputs, [new_node]))
+        to_nodes = to_nodes[to_nodes != from_node]
+        to_node = to_nodes[rng.integers(len(to_nodes))]
+        new_weight = rng.normal(0, 1)
+
+        existing = np.flatnonzero((src == from_node) & (tgt == to_node))
+        if existing.size:
+            weight = weight.copy()
+            weight[existing[0]] = new_weight
+            return src, tgt, weight
+        return np.append(src, from_node), np.append(tgt, to_node), np.append(weight, new_weight)
@@ -0,0 +1,195 @@
+'''
+Island-model evolution: K headless SimWorlds in their own processes,
+exchanging genomes.
+
+Every island is an independent world (own seed, output directory and
+settings overrides, like an ensemble run). Every `interval` frames each
+island sends copies of the genomes (Podd.genome) of `migrants` randomly
+picked podds to another island, and adds the genomes it receives as new
+podds at random positions in the food box. Where they go is set by the
+topology:
+
+    ring    island i sends to island i+1 (the last to the first)
+    random  every migration a random permutation without fixed points,
+            the same on every island (drawn from the ensemble seed)
+
+Either way every island receives from exactly one island per migration and
+waits for it, so the islands stay in step and a run is reproducible for a
+given seed. Genomes travel pickled over multiprocessing queues, the only
+communication between the islands. An extinct island keeps running and is
+repopulated by the next immigrants.
+
+python islands.py --islands 8 --frames 36000 --interval 600 --migrants 4
+'''
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+import settings
+from ensemble import merge_histories, parse_override, prepare_run
+from settings import WorldSettings as WS
+from sinks import read_records
+
+TOPOLOGIES = ("ring", "random")
+
+
+def migration_targets(topology, islands, migration, seed):
+    ''' [island each island sends to] for the migration-th migration '''
+    if islands < 2:
+        return [None] * islands
+    if topology == "ring":
+        return [(i + 1) % islands for i in range(islands)]
+    if topology == "random":
+        rng = np.random.default_rng([seed, migration])
+        while True:  # rejection sampling of a derangement, accepted about 1/e of the time
+            targets = rng.permutation(islands)
+            if not (targets == np.arange(islands)).any():
+                return targets.tolist()
+    raise ValueError(f"Unknown migration topology: {topology}")
+
+
+def emigrants(world, count, rng):
+    ''' Genomes of `count` living podds picked at random (in id order, without replacement) '''
+    ids = sorted(world.podds)
+    if not ids:
+        return []
+    picked = rng.choice(len(ids), min(count, len(ids)), replace=False)
+    return [world.podds[ids[i]][1].genome for i in sorted(picked.tolist())]
+
+
+def settle(world, genomes, rng):
+    ''' Adds the immigrant genomes as new podds, parentless, at random positions in the food box '''
+    c = WS.spawn_food_box / WS.grid
+    for genome in genomes:
+        x, y = rng.uniform(-c, c, 2).tolist()
+        world.add_podd(genome, position=(x, y))
+
+
+def run_island(config, inboxes, results):
+    '''
+    Runs island config["island"] in this (fresh) process, migrating through
+    the inboxes (one queue per island). Puts its result on `results`.
+    '''
+    prepare_run(config)
+    from world import SimWorld, world_logger
+
+    island, seed = config["island"], config["seed"]
+    frames, interval, count = config["frames"], config["interval"], config["migrants"]
+    inbox = inboxes[island]
+    rng = np.random.default_rng([config["ensemble_seed"], island])  # picks emigrants and places immigrants
+    pending = {}  # {migration: genomes} that arrived before this island got there
+    sent = received = 0
+
+    world = SimWorld()
+    t_start = time.time()
+    try:
+        for migration, start in enumerate(range(0, frames, interval)):
+            for _ in range(min(interval, frames - start)):
+                world.Step(world.settings)
+            if start + interval >= frames:
+                break  # no migration after the last frame
+            target = migration_targets(config["topology"], config["islands"], migration, config["ensemble_seed"])[island]
+            if target is None:
+                continue
+            genomes = emigrants(world, count, rng)
+            inboxes[target].put((migration, genomes))
+            sent += len(genomes)
+            world_logger.info("Migration %s at frame %s: %s genomes sent to island %s", migration, world.frame_counter,
+                              len(genomes), target)
+            while migration not in pending:
+                arrived, arrived_genomes = inbox.get(timeout=config["timeout"])
+                pending[arrived] = arrived_genomes
+            genomes = pending.pop(migration)
+            settle(world, genomes, rng)
+            received += len(genomes)
+    finally:
+        world.Shutdown()
+        world.world.contactListener = None
+        world.world.destructionListener = None
+
+    elapsed = max(time.time() - t_start, 1e-9)
+    columns, rows = read_records("history", settings.OutputSettings.backend, config["output_dir"])
+    results.put({"island": island, "seed": seed, "output_dir": config["output_dir"], "steps": world.frame_counter,
+                 "elapsed": elapsed, "steps_per_sec": world.frame_counter / elapsed, "population": len(world.podds),
+                 "emigrants": sent, "immigrants": received, "columns": columns, "history": rows})
+
+
+def run_islands(islands, frames, interval, migrants, topology="ring", seed=0, overrides=None,
+                island_overrides=None, output_dir="islands", timeout=600):
+    '''
+    Runs `islands` worlds for `frames` frames, one process each, seeded
+    seed, seed+1, ... Every `interval` frames every island sends `migrants`
+    genomes along `topology`. `overrides` apply to every island,
+    island_overrides[i] (if given) on top of them for island i. An island
+    waiting `timeout` seconds for immigrants fails the run.
+    Returns the per-island results, in island order.
+    '''
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown migration topology: {topology}")
+    if interval < 1:
+        raise ValueError("The migration interval must be at least one frame")
+    context = mp.get_context("spawn")  # every island starts from a fresh interpreter, see ensemble.py
+    inboxes = [context.Queue() for _ in range(islands)]
+    results_queue = context.Queue()
+    processes = []
+    for i in range(islands):
+        island_settings = {cls_name: dict(values) for cls_name, values in (overrides or {}).items()}
+        for cls_name, values in (island_overrides[i] if island_overrides else {}).items():
+            island_settings.setdefault(cls_name, {}).update(values)
+        config = {"island": i, "islands": islands, "seed": seed + i, "ensemble_seed": seed, "frames": frames,
+                  "interval": interval, "migrants": migrants, "topology": topology, "timeout": timeout,
+                  "overrides": island_settings, "output_dir": os.path.join(output_dir, f"island{i:03}")}
+        processes.append(context.Process(target=run_island, args=(config, inboxes, results_queue), name=f"island{i:03}"))
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    t_start = time.time()
+    for process in processes:
+        process.start()
+    try:
+        while len(results) < islands:
+            try:
+                result = results_queue.get(timeout=1)
+            except queue.Empty:
+                # an island that died without a result would leave the others waiting for its migrants
+                failed = [process.name for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Island process failed: {', '.join(failed)}")
+                continue
+            results.append(result)
+            print(f"[{len(results)}/{islands}] island {result['island']} (seed {result['seed']}) finished: "
+                  f"{result['steps']} steps at {result['steps_per_sec']:.0f} steps/s, population {result['population']}, "
+                  f"{result['emigrants']} emigrants, {result['immigrants']} immigrants | {time.time() - t_start:.1f}s elapsed")
+    finally:
+        for process in processes:
+            if len(results) < islands:
+                process.terminate()
+            process.join()
+    results.sort(key=lambda result: result["island"])
+    merge_histories(results, output_dir, "island_history", "island")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run EvoSim worlds as islands exchanging genomes")
+    parser.add_argument("--islands", type=int, default=mp.cpu_count(), help="number of islands (processes)")
+    parser.add_argument("--frames", type=int, required=True, help="frames every island runs")
+    parser.add_argument("--interval", type=int, default=600, help="frames between migrations")
+    parser.add_argument("--migrants", type=int, default=4, help="genomes every island sends per migration")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="ring", help="where migrants go")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first island, island i uses seed+i")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds an island waits for immigrants before failing")
+    parser.add_argument("--out", default="islands", help="output directory")
+    parser.add_argument("--set", action="append", default=[], metavar="Class.attr=value", help="settings override for every island")
+    args = parser.parse_args()
+
+    overrides = {}
+    for text in args.set:
+        cls_name, attr, value = parse_override(text)
+        overrides.setdefault(cls_name, {})[attr] = value
+    run_islands(args.islands, args.frames, args.interval, args.migrants, args.topology, args.seed, overrides,
+                output_dir=args.out, timeout=args.timeout)
@@ -0,0 +1,122 @@
+'''
+Lineage store: who descends from whom, on disk.
+
+Every birth (id, parent, frame) and death (id, frame) goes into a SQLite
+database in WAL mode. The records are batched by a BufferedSink, so the
+simulation thread only appends to a list, and queries read the database
+through their own connection while the sink keeps writing. The tree is
+never held in memory.
+
+Ids are handed out in birth order, so an ancestor always has a smaller id
+than its descendants. Ancestors cost one primary key lookup per
+generation, the most recent common ancestor one per generation back to
+it, descendants and clade sizes one parent index lookup per member of
+the clade.
+'''
+import sqlite3
+
+from sinks import BufferedSink
+
+BIRTH, DEATH = 0, 1
+
+
+class LineageSink:
+    ''' Writes batches of (BIRTH, id, parent, frame) and (DEATH, id, frame) records '''
+
+    def __init__(self, path, append=False):
+        self.path = path
+        # written from the flush thread, access is serialized by BufferedSink
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        if not append:
+            self.connection.execute("DROP TABLE IF EXISTS lineage")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lineage "
+                                "(id INTEGER PRIMARY KEY, parent INTEGER, birth_frame INTEGER, death_frame INTEGER)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS lineage_parent ON lineage (parent)")
+        self.connection.commit()
+
+    def write_many(self, records):
+        with self.connection:  # one transaction per batch
+            # a resumed run re-records the births after its checkpoint
+            self.connection.executemany("INSERT OR REPLACE INTO lineage VALUES (?, ?, ?, NULL)",
+                                        [record[1:] for record in records if record[0] == BIRTH])
+            self.connection.executemany("UPDATE lineage SET death_frame = ? WHERE id = ?",
+                                        [(record[2], record[1]) for record in records if record[0] == DEATH])
+
+    def close(self):
+        self.connection.close()
+
+
+class LineageStore:
+    '''
+    birth()/death() record events, the other methods query everything
+    recorded so far (pending records are flushed first).
+    '''
+
+    def __init__(self, path, append=False, flush_interval=1.0, max_buffer=10000):
+        self.path = path
+        self.sink = BufferedSink(LineageSink(path, append), flush_interval, max_buffer)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+    def birth(self, id, parent, frame):
+        self.sink.write(BIRTH, id, parent, frame)
+
+    def death(self, id, frame):
+        self.sink.write(DEATH, id, frame)
+
+    def flush(self):
+        self.sink.flush()
+
+    def close(self):
+        self.sink.close()
+        self.connection.close()
+
+    def _query(self, sql, *args):
+        self.sink.flush()
+        return self.connection.execute(sql, args).fetchall()
+
+    def record(self, id):
+        ''' (parent, birth_frame, death_frame) of podd id, or None if it is unknown '''
+        rows = self._query("SELECT parent, birth_frame, death_frame FROM lineage WHERE id = ?", id)
+        return rows[0] if rows else None
+
+    def children(self, id):
+        return [child for child, in self._query("SELECT id FROM lineage WHERE parent = ? ORDER BY id", id)]
+
+    def ancestors(self, id):
+        ''' Ids of the parent, grandparent, ... of id, up to the first podd of its line '''
+        return [ancestor for ancestor, in self._query(
+            "WITH RECURSIVE line(id) AS (SELECT parent FROM lineage WHERE id = ? "
+            "UNION ALL SELECT lineage.parent FROM lineage JOIN line ON lineage.id = line.id) "
+            "SELECT id FROM line WHERE id IS NOT NULL", id)]
+
+    def descendants(self, id):
+        ''' Ids of every podd descending from id, in birth order '''
+        return [descendant for descendant, in self._query(
+            "WITH RECURSIVE clade(id) AS (SELECT id FROM lineage WHERE parent = ? "
+            "UNION ALL SELECT lineage.id FROM lineage JOIN clade ON lineage.parent = clade.id) "
+            "SELECT id FROM clade ORDER BY id", id)]
+
+    def clade_size(self, id):
+        ''' Number of podds in the clade of id: id and all its descendants '''
+        (size,), = self._query(
+            "WITH RECURSIVE clade(id) AS (SELECT id FROM lineage WHERE id = ? "
+            "UNION ALL SELECT lineage.id FROM lineage JOIN clade ON lineage.parent = clade.id) "
+            "SELECT COUNT(*) FROM clade", id)
+        return size
+
+    def mrca(self, a, b):
+        '''
+        Most recent common ancestor of a and b (a podd counts as its own
+        ancestor), None if their lines never meet. The younger (larger id)
+        of the two steps up to its parent until they meet, so the cost is
+        the number of generations back to the common ancestor.
+        '''
+        rows = self._query(
+            "WITH RECURSIVE walk(a, b) AS (SELECT ?, ? "
+            "UNION ALL SELECT CASE WHEN a > b THEN (SELECT parent FROM lineage WHERE id = a) ELSE a END, "
+            "CASE WHEN b > a THEN (SELECT parent FROM lineage WHERE id = b) ELSE b END "
+            "FROM walk WHERE a != b) "
+            "SELECT a FROM walk WHERE a = b", a, b)
+        return rows[0][0] if rows else None
@@ -1,4 +1,29 @@
+import argparse
+
+from settings import FrameworkSettings as FS, OutputSettings as OS
+
+parser = argparse.ArgumentParser(description="Run the EvoSim world")
+parser.add_argument("--headless", action="store_true", help="run without pygame as fast as possible")
+parser.add_argument("--frames", type=int, default=None, help="headless: stop after this many frames")
+parser.add_argument("--time-limit", type=float, default=None, help="headless: stop after this many wall-clock seconds")
+parser.add_argument("--decoupled", action="store_true", help="simulate on a background thread, render snapshots at a fixed rate")
+parser.add_argument("--speed", type=float, default=None, help="decoupled: simulated seconds per real second (0 = unthrottled)")
+parser.add_argument("--resume", default=None, metavar="CHECKPOINT", help="resume the world saved in a checkpoint file")
+parser.add_argument("--checkpoint-interval", type=float, default=None, help="simulated seconds between checkpoints")
+args = parser.parse_args()
+
+if args.headless:
+    FS.headless = True
+    FS.headless_frames = args.frames
+    FS.headless_time_limit = args.time_limit
+if args.decoupled:
+    FS.decoupled = True
+    if args.speed is not None:
+        FS.sim_speed = args.speed
+if args.checkpoint_interval is not None:
+    OS.checkpoint_interval = args.checkpoint_interval
+
 from world import SimWorld
 from custom_framework import main
 
-main(SimWorld)
\ No newline at end of file
+main(SimWorld, args.resume)
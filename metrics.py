@@ -0,0 +1,114 @@
+'''
+Per-phase frame timing.
+
+FrameTimer keeps the duration of every phase of the last `window` frames in
+a ring buffer, next to the population size of each frame, and summarises
+them as p50/p95/p99. Summaries are exported as CSV rows or as a Prometheus
+text file (for the node exporter textfile collector or any scraper).
+'''
+import os
+from time import perf_counter
+
+import numpy as np
+
+QUANTILES = (50, 95, 99)
+CSV_COLUMNS = ["time", "frame", "population", "avg_population", "phase", "frames",
+               "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+
+class FrameTimer:
+    '''
+    Times consecutive phases of a frame: start() at the top of the frame,
+    mark(phase) at the end of each phase (records the time since the previous
+    mark), end_frame(population) once the frame is done.
+    '''
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.phases = {}  # {phase: column}
+        self.samples = np.zeros((window, 0))  # seconds, one row per frame
+        self.population = np.zeros(window, dtype=np.intp)
+        self.totals = []  # cumulative seconds per column
+        self.frames = 0  # frames recorded since the start
+        self.row = 0
+        self.t_last = perf_counter()
+
+    def start(self):
+        self.t_last = perf_counter()
+
+    def mark(self, phase):
+        t_now = perf_counter()
+        column = self.phases.get(phase)
+        if column is None:
+            column = self.phases[phase] = len(self.phases)
+            self.samples = np.concatenate((self.samples, np.zeros((self.window, 1))), axis=1)
+            self.totals.append(0.0)
+        elapsed = t_now - self.t_last
+        self.samples[self.row, column] = elapsed
+        self.totals[column] += elapsed
+        self.t_last = t_now
+
+    def end_frame(self, population):
+        self.population[self.row] = population
+        self.frames += 1
+        self.row = self.frames % self.window
+        self.samples[self.row] = 0  # phases skipped in the next frame count as 0
+
+    def summary(self):
+        '''
+        {phase: {"frames", "mean", "p50", "p95", "p99", "max", "total"}} over
+        the frames in the window, in seconds. "total" is since the start.
+        '''
+        n = min(self.frames, self.window)
+        samples = self.samples[:n]
+        result = {}
+        for phase, column in self.phases.items():
+            values = samples[:, column]
+            quantiles = np.percentile(values, QUANTILES) if n else np.zeros(len(QUANTILES))
+            result[phase] = {"frames": n, "mean": values.mean() if n else 0.0, "max": values.max() if n else 0.0,
+                             "total": self.totals[column],
+                             **{f"p{q}": value for q, value in zip(QUANTILES, quantiles)}}
+        return result
+
+    def avg_population(self):
+        n = min(self.frames, self.window)
+        return self.population[:n].mean() if n else 0.0
+
+    def csv_rows(self, time_s, frame, population):
+        ''' One CSV_COLUMNS row per phase '''
+        avg_population = self.avg_population()
+        return [(time_s, frame, population, round(avg_population, 1), phase, s["frames"],
+                 *(round(s[key] * 1e3, 4) for key in ("mean", "p50", "p95", "p99", "max")))
+                for phase, s in self.summary().items()]
+
+    def prometheus(self, frame, population):
+        ''' The summary in the Prometheus text exposition format '''
+        lines = [
+            "# HELP evosim_phase_seconds Duration of each SimWorld.Step phase over the last frames",
+            "# TYPE evosim_phase_seconds summary",
+        ]
+        for phase, s in self.summary().items():
+            for q in QUANTILES:
+                lines.append(f'evosim_phase_seconds{{phase="{phase}",quantile="{q/100}"}} {s[f"p{q}"]:.9f}')
+            lines.append(f'evosim_phase_seconds_sum{{phase="{phase}"}} {s["total"]:.9f}')
+            lines.append(f'evosim_phase_seconds_count{{phase="{phase}"}} {self.frames}')
+        lines += [
+            "# HELP evosim_population Number of living podds",
+            "# TYPE evosim_population gauge",
+            f"evosim_population {population}",
+            "# HELP evosim_avg_population Mean number of living podds over the last frames",
+            "# TYPE evosim_avg_population gauge",
+            f"evosim_avg_population {self.avg_population():.1f}",
+            "# HELP evosim_frames_total Frames simulated",
+            "# TYPE evosim_frames_total counter",
+            f"evosim_frames_total {frame}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def write_prometheus(text, path):
+    ''' Replaces the file atomically, so a scraper never reads half of it '''
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -0,0 +1,186 @@
+'''
+Spatially partitioned world: one arena split into rows x cols rectangular
+regions, each a RegionWorld (region.py) with its own Box2D world and food
+in its own process.
+
+Podds crossing a region edge are handed off to the neighbouring region,
+and podds within WS.partition_ghost of an edge are mirrored as ghost bodies
+on the other side, so contacts across the edges still happen. The regions
+exchange one message per neighbour (the 8 around it) every frame and wait
+for each other, so they run in step and a run is reproducible for a seed.
+
+Every region gets its share of the food and sunlight: 1/regions of
+init_food, max_food and sunlight_energy (split among the region's podds),
+every `regions` times WS.spawn_food_interval. Births and deaths
+of one podd can happen in different regions, so the lineage store is off;
+history and census are per region, the histories are merged into
+partition_history.
+
+python partition.py --rows 2 --cols 2 --frames 36000 --set WorldSettings.init_podds=200
+'''
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+import settings
+from ensemble import merge_histories, parse_override, prepare_run
+from settings import WorldSettings as WS
+from sinks import read_records
+
+
+class Partition:
+    ''' The regions of the arena [-c, c]^2 (c = WS.spawn_food_box / WS.grid), numbered row * cols + col '''
+
+    def __init__(self, rows, cols, half_width=None):
+        self.rows = rows
+        self.cols = cols
+        self.regions = rows * cols
+        self.half_width = WS.spawn_food_box / WS.grid if half_width is None else half_width
+        self.width = 2 * self.half_width / cols
+        self.height = 2 * self.half_width / rows
+
+    def column_of(self, x):
+        ''' Region column of x coordinates, positions outside the arena go to the nearest column '''
+        return np.clip(np.floor((np.asarray(x) + self.half_width) / self.width).astype(int), 0, self.cols - 1)
+
+    def row_of(self, y):
+        return np.clip(np.floor((np.asarray(y) + self.half_width) / self.height).astype(int), 0, self.rows - 1)
+
+    def region_of(self, positions):
+        ''' Region of one (x, y) position, or an array of regions for an (n, 2) array '''
+        positions = np.asarray(positions, dtype=float)
+        regions = self.row_of(positions[..., 1]) * self.cols + self.column_of(positions[..., 0])
+        return int(regions) if regions.ndim == 0 else regions
+
+    def bounds(self, region):
+        ''' (x0, x1, y0, y1), with the outer edges of the arena at infinity '''
+        row, col = divmod(region, self.cols)
+        x0 = -np.inf if col == 0 else -self.half_width + col * self.width
+        x1 = np.inf if col == self.cols - 1 else -self.half_width + (col + 1) * self.width
+        y0 = -np.inf if row == 0 else -self.half_width + row * self.height
+        y1 = np.inf if row == self.rows - 1 else -self.half_width + (row + 1) * self.height
+        return x0, x1, y0, y1
+
+    def neighbors(self, region):
+        row, col = divmod(region, self.cols)
+        return [r * self.cols + c for r in range(max(row - 1, 0), min(row + 2, self.rows))
+                for c in range(max(col - 1, 0), min(col + 2, self.cols)) if (r, c) != (row, col)]
+
+    def toward(self, region, target):
+        ''' The neighbour of region on the way to target '''
+        row, col = divmod(region, self.cols)
+        target_row, target_col = divmod(target, self.cols)
+        return (row + int(np.sign(target_row - row))) * self.cols + col + int(np.sign(target_col - col))
+
+    def near(self, region, positions, margin):
+        ''' Mask of the (n, 2) positions within margin of region '''
+        x0, x1, y0, y1 = self.bounds(region)
+        x, y = positions[:, 0], positions[:, 1]
+        return (x >= x0 - margin) & (x < x1 + margin) & (y >= y0 - margin) & (y < y1 + margin)
+
+
+def run_region(config, inboxes, results):
+    '''
+    Runs region config["region"] in this (fresh) process, exchanging with
+    its neighbours through the inboxes. Puts its result on `results`.
+    '''
+    prepare_run(config)
+    partition = Partition(config["rows"], config["cols"])
+    region, regions = config["region"], partition.regions
+    WS.spawn_food_interval *= regions
+    WS.init_food = round(WS.init_food / regions)
+    WS.max_food = WS.max_food // regions
+    WS.sunlight_energy /= regions
+    if WS.random_seed is not None:  # a different stream per region
+        WS.random_seed = int(np.random.SeedSequence([WS.random_seed, region]).generate_state(1)[0])
+    settings.OutputSettings.lineage_file = ""
+    settings.OutputSettings.checkpoint_interval = 0
+    from region import RegionWorld
+
+    world = RegionWorld(partition, region, inboxes, config["timeout"], config["ghost"])
+    t_start = time.time()
+    try:
+        for _ in range(config["frames"]):
+            world.Step(world.settings)
+    finally:
+        world.Shutdown()
+        world.world.contactListener = None
+        world.world.destructionListener = None
+
+    elapsed = max(time.time() - t_start, 1e-9)
+    columns, rows = read_records("history", settings.OutputSettings.backend, config["output_dir"])
+    results.put({"region": region, "seed": config["seed"], "output_dir": config["output_dir"], "steps": world.frame_counter,
+                 "elapsed": elapsed, "steps_per_sec": world.frame_counter / elapsed, "population": len(world.podds),
+                 "handoffs_sent": world.handoffs_sent, "handoffs_received": world.handoffs_received,
+                 "columns": columns, "history": rows})
+
+
+def run_partition(rows, cols, frames, seed=0, overrides=None, output_dir="partition", ghost=None, timeout=600):
+    '''
+    Runs one world split into rows x cols regions for `frames` frames, one
+    process per region, region i seeded seed+i. `overrides` apply to every
+    region. A region waiting `timeout` seconds for a neighbour fails the run.
+    Returns the per-region results, in region order.
+    '''
+    regions = rows * cols
+    context = mp.get_context("spawn")  # every region starts from a fresh interpreter, see ensemble.py
+    inboxes = [context.Queue() for _ in range(regions)]
+    results_queue = context.Queue()
+    processes = []
+    for i in range(regions):
+        config = {"region": i, "rows": rows, "cols": cols, "seed": seed + i, "frames": frames, "ghost": ghost,
+                  "timeout": timeout, "overrides": overrides or {}, "output_dir": os.path.join(output_dir, f"region{i:03}")}
+        processes.append(context.Process(target=run_region, args=(config, inboxes, results_queue), name=f"region{i:03}"))
+
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    t_start = time.time()
+    for process in processes:
+        process.start()
+    try:
+        while len(results) < regions:
+            try:
+                result = results_queue.get(timeout=1)
+            except queue.Empty:
+                # a region that died without a result would leave its neighbours waiting
+                failed = [process.name for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"Region process failed: {', '.join(failed)}")
+                continue
+            results.append(result)
+            print(f"[{len(results)}/{regions}] region {result['region']} finished: {result['steps']} steps at "
+                  f"{result['steps_per_sec']:.0f} steps/s, population {result['population']}, "
+                  f"{result['handoffs_sent']} podds handed off, {result['handoffs_received']} taken over "
+                  f"| {time.time() - t_start:.1f}s elapsed")
+    finally:
+        for process in processes:
+            if len(results) < regions:
+                process.terminate()
+            process.join()
+    results.sort(key=lambda result: result["region"])
+    merge_histories(results, output_dir, "partition_history", "region")
+    print(f"Population {sum(result['population'] for result in results)} in {regions} regions")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one EvoSim world split into regions on separate processes")
+    parser.add_argument("--rows", type=int, default=2, help="regions along y")
+    parser.add_argument("--cols", type=int, default=2, help="regions along x")
+    parser.add_argument("--frames", type=int, required=True, help="frames to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first region, region i uses seed+i")
+    parser.add_argument("--ghost", type=float, default=None, help="ghost zone width (default: WorldSettings.partition_ghost)")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds a region waits for a neighbour before failing")
+    parser.add_argument("--out", default="partition", help="output directory")
+    parser.add_argument("--set", action="append", default=[], metavar="Class.attr=value", help="settings override for every region")
+    args = parser.parse_args()
+
+    overrides = {}
+    for text in args.set:
+        cls_name, attr, value = parse_override(text)
+        overrides.setdefault(cls_name, {})[attr] = value
+    run_partition(args.rows, args.cols, args.frames, args.seed, overrides, args.out, args.ghost, args.timeout)
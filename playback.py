@@ -0,0 +1,112 @@
+'''
+Plays a replay recorded with OutputSettings.replay_file (replay.py), from
+the files alone: nothing is simulated, podds and food are drawn from the
+recorded frames.
+
+    Space        pause / play
+    [ / ]        half / double speed
+    , / .        one frame back / forward (pauses)
+    PgUp / PgDn  10 s back / forward
+    0-9          jump to 0%, 10%, ... 90% of the replay
+    End          jump to the end (of a replay still being recorded)
+    Z / X, scroll, right drag, arrows  zoom and pan
+
+python playback.py replay.evr --speed 4
+'''
+import argparse
+from time import time
+
+parser = argparse.ArgumentParser(description="Play an EvoSim replay")
+parser.add_argument("replay", help="replay file (OutputSettings.replay_file)")
+parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per real second")
+parser.add_argument("--frame", type=int, default=None, help="start at this frame (default: the first recorded)")
+args = parser.parse_args()
+
+import pygame
+
+from custom_framework import CustomFramework, Keys
+from replay import Replay
+from settings import FrameworkSettings as FS, WorldSettings as WS
+from sprites import SpriteRenderer
+
+MIN_SPEED, MAX_SPEED = 1/16, 1024
+REFRESH_INTERVAL = 1.0  # seconds between looks for new records while at the end of the replay
+
+
+class PlaybackViewer(CustomFramework):
+    name = "Replay"
+    description = "Space: pause, [ ]: speed, , .: step, PgUp/PgDn: 10 s, 0-9: seek, Esc: quit"
+
+    def __init__(self, path, speed=1.0, frame=None):
+        super(PlaybackViewer, self).__init__()
+        self.replay = Replay(path)
+        self.sprites = SpriteRenderer(self)
+        self.speed = speed
+        self.paused = False
+        self.position = float(self.replay.first_frame if frame is None else frame)  # fractional frame
+        self.t_refresh = 0.0
+
+    def run(self):
+        clock = pygame.time.Clock()
+        t_last = time()
+        while self.checkViewerEvents():
+            self.CheckKeys()
+            t_now = time()
+            if not self.paused:
+                self.position += (t_now - t_last) * FS.hz * self.speed
+            t_last = t_now
+            if self.position > self.replay.last_frame and t_now - self.t_refresh >= REFRESH_INTERVAL:
+                self.replay.refresh()  # the world may still be recording
+                self.t_refresh = t_now
+            self.position = min(max(self.position, self.replay.first_frame), self.replay.last_frame)
+
+            self.screen.fill((0, 0, 0))
+            self.textLine = self.TEXTLINE_START
+            self.Print(self.name, (127, 127, 255))
+            snapshot = self.replay.seek(int(self.position))
+            if snapshot is not None:
+                self.DrawSnapshot(snapshot)
+            self.Print("Speed x%g%s, render %.1f fps" % (self.speed, " (paused)" if self.paused else "", clock.get_fps()))
+            pygame.display.flip()
+            clock.tick(FS.render_fps)
+
+    def DrawSnapshot(self, snapshot):
+        self.sprites.draw_food(self.screen, snapshot["food"])
+        self.sprites.draw_podds(self.screen, snapshot["positions"], snapshot["angles"], snapshot["scales"], snapshot["awake"])
+        if WS.enable_border:
+            c = WS.spawn_food_box / WS.grid
+            pygame.draw.aalines(self.screen, (127, 230, 127), True, self.sprites.to_screen([(c, c), (-c, c), (-c, -c), (c, -c)]).tolist())
+        self.Print("Frame %d / %d (%.1f s) population %d food %d" % (snapshot["frame"], self.replay.last_frame,
+                   snapshot["frame"] / FS.hz, len(snapshot["ids"]), len(snapshot["food"])))
+
+    def step_record(self, step):
+        ''' Pauses on the recorded frame `step` records away from the shown one '''
+        self.paused = True
+        record = min(max(self.replay.record + step, 0), len(self.replay) - 1)
+        self.position = float(self.replay.frames[record])
+
+    def Keyboard(self, key):
+        if key == Keys.K_SPACE:
+            self.paused = not self.paused
+        elif key == Keys.K_LEFTBRACKET:
+            self.speed = max(self.speed / 2, MIN_SPEED)
+        elif key == Keys.K_RIGHTBRACKET:
+            self.speed = min(self.speed * 2, MAX_SPEED)
+        elif key == Keys.K_COMMA:
+            self.step_record(-1)
+        elif key == Keys.K_PERIOD:
+            self.step_record(1)
+        elif key == Keys.K_PAGEUP:
+            self.position -= 10 * FS.hz
+        elif key == Keys.K_PAGEDOWN:
+            self.position += 10 * FS.hz
+        elif Keys.K_0 <= key <= Keys.K_9:
+            first, last = self.replay.first_frame, self.replay.last_frame
+            self.position = first + (last - first) * (key - Keys.K_0) / 10
+        elif key == Keys.K_END:
+            self.replay.refresh()
+            self.position = self.replay.last_frame
+
+
+if __name__ == "__main__":
+    PlaybackViewer(args.replay, args.speed, args.frame).run()
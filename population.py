@@ -0,0 +1,176 @@
+'''
+Columnar (structure-of-arrays) store for the per-frame state of all podds.
+'''
+import logging
+import numpy as np
+
+from settings import PoddSettings as PS, BrainSettings as BS, FrameworkSettings as FS, WorldSettings as WS
+from rng import streams
+from stats import PopulationStats
+from utils import get_logger
+
+death_logger = get_logger(__name__, "DEATH")
+
+def death_rate(age):
+    return PS.fixed_death_rate + age * PS.age_deterioration
+
+death_rates = np.array([death_rate(i) for i in range(240)])  # death rate jump up every second to update to new age
+
+
+class PoddStore:
+    '''
+    Holds energy, age, status flags etc. of every podd in NumPy arrays indexed
+    by slot, so per-frame upkeep runs as whole-array operations. Freed slots
+    are reused through a free list. Podd objects are thin views on one slot.
+
+    `stats` follows the traits of the living podds (net energy, size,
+    strength, complexity): every change to them goes through the store.
+    '''
+    columns = {
+        "energy": float,
+        "min_energy": float,
+        "age": float,
+        "size": float,
+        "strength": float,
+        "birth_energy": float,
+        "complexity": float,
+        "dead": bool,
+        "give_birth": bool,
+        "alive": bool,  # slot is in use
+        "id": np.int64,  # podd id
+    }
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.podds = []  # slot -> Podd
+        self.free = []
+        for name, dtype in self.columns.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        self.previous_action = np.zeros((0, BS.n_outputs))
+        self.stats = PopulationStats()
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        extra = capacity - self.capacity
+        for name, dtype in self.columns.items():
+            setattr(self, name, np.concatenate((getattr(self, name), np.zeros(extra, dtype=dtype))))
+        self.previous_action = np.concatenate((self.previous_action, np.zeros((extra, BS.n_outputs))))
+        self.podds += [None] * extra
+        self.free += reversed(range(self.capacity, capacity))  # pop() hands out the lowest slot first
+        self.capacity = capacity
+
+    def allocate(self, podd, slot=None):
+        ''' Takes the next free slot for podd, or the given free slot (used when restoring) '''
+        if slot is not None:
+            if slot >= self.capacity:
+                self._grow(max(slot + 1, 2 * self.capacity))
+            self.free.remove(slot)
+        else:
+            if not self.free:
+                self._grow(max(1, 2 * self.capacity))
+            slot = self.free.pop()
+        self.podds[slot] = podd
+        self.id[slot] = podd.id
+        self.energy[slot] = PS.init_energy
+        self.min_energy[slot] = 0
+        self.age[slot] = 0  # number of seconds alive
+        self.size[slot] = podd.genome["size"]
+        self.strength[slot] = podd.genome["strength"]
+        self.birth_energy[slot] = podd.genome["birth_energy"]
+        self.complexity[slot] = podd.brain.complexity
+        self.previous_action[slot] = 0
+        self.dead[slot] = False
+        self.give_birth[slot] = False
+        self.alive[slot] = True
+        self.stats.add(self.traits(slot))
+        return slot
+
+    def release(self, slot):
+        self.stats.remove(self.traits(slot))
+        self.alive[slot] = False
+        self.dead[slot] = False
+        self.give_birth[slot] = False
+        self.podds[slot] = None
+        self.free.append(slot)
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def traits(self, slots):
+        ''' {trait: value(s)} of the podds in slots (one slot or an array) '''
+        return {"energy": self.energy[slots] - self.min_energy[slots], "size": self.size[slots],
+                "strength": self.strength[slots], "complexity": self.complexity[slots]}
+
+    def set_energy(self, slots, energy):
+        old = self.energy[slots] - self.min_energy[slots]
+        self.energy[slots] = energy
+        self.stats.change("energy", old, self.energy[slots] - self.min_energy[slots])
+
+    def add_energy(self, slots, amount):
+        self.set_energy(slots, self.energy[slots] + amount)
+
+    def draw(self, stream, slots):
+        '''
+        One uniform per slot from `stream`, handed out in podd id order: a
+        podd gets the same value whatever order the slots are evaluated in.
+        '''
+        values = np.empty(len(slots))
+        values[np.argsort(self.id[slots], kind="stable")] = stream.random(len(slots))
+        return values
+
+    def resync_stats(self):
+        ''' Recomputes the stats from the columns, after they were written directly (eg. restoring a checkpoint) '''
+        self.stats.resync(self.traits(self.alive))
+
+    def observe(self, slots, out=None):
+        '''
+        Per-frame bookkeeping before the brains run. Returns the internal brain
+        inputs, one row per slot, written into `out` if given.
+        '''
+        self.age[slots] += 1/FS.hz
+        # self.min_energy[slots] += PS.age_factor * 2 * (np.random.random(len(slots))>0.5)
+        full = slots[self.energy[slots] > PS.max_energy]
+        self.set_energy(full, PS.max_energy)
+        self.give_birth[slots] = False
+        noise = self.draw(streams.noise, slots) - 0.5
+        if out is None:
+            out = np.empty((len(slots), BS.n_internal_inputs))
+        out[:, 0] = self.energy[slots]
+        out[:, 1:1+BS.n_outputs] = self.previous_action[slots]
+        out[:, 1+BS.n_outputs] = noise
+        out[:, 2+BS.n_outputs] = 1
+        return out
+
+    def act(self, slots, brain_outputs, n_podds):
+        '''
+        Applies the energy costs and status effects of the brain outputs for
+        the given slots. Returns the boolean matrix of active move actions.
+        '''
+        self.previous_action[slots] = brain_outputs
+        moves = brain_outputs > 0
+        old_energy = self.energy[slots] - self.min_energy[slots]
+        # energy tracking
+        self.energy[slots] += WS.sunlight_energy/max(n_podds, 1) - PS.ec_moving*moves.sum(axis=1) \
+            - PS.ec_living - PS.ec_factor_brain*self.complexity[slots] - PS.ec_factor_size*self.size[slots] \
+            - PS.ec_factor_str*self.size[slots]
+        # status effects
+        energy = self.energy[slots]
+        no_energy = energy <= self.min_energy[slots]
+        age_index = np.minimum(self.age[slots].astype(int), len(death_rates) - 1)
+        old_age = ~no_energy & (self.draw(streams.death, slots) < death_rates[age_index])
+        if death_logger.isEnabledFor(logging.INFO):
+            for slot, cause in [(slot, "no_energy") for slot in slots[no_energy]] + [(slot, "age") for slot in slots[old_age]]:
+                podd = self.podds[slot]
+                death_logger.info("%s died. Cause: %s Age: %02f Children: %s", podd.id, cause, self.age[slot], podd.children)
+        self.dead[slots] |= no_energy | old_age
+        give_birth = energy >= self.birth_energy[slots] + self.min_energy[slots]
+        self.give_birth[slots] = give_birth
+        self.energy[slots[give_birth]] -= PS.birth_cost
+        self.stats.change("energy", old_energy, self.energy[slots] - self.min_energy[slots])
+        return moves
+
+    def dead_slots(self):
+        return np.flatnonzero(self.alive & self.dead)
+
+    def birth_slots(self):
+        return np.flatnonzero(self.alive & self.give_birth & ~self.dead)
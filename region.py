@@ -0,0 +1,157 @@
+'''
+One region of a partitioned world (see partition.py).
+
+A RegionWorld is a SimWorld that owns the podds and food in one rectangle
+of the arena. After every step it exchanges one message with each
+neighbouring region:
+
+    handoffs  the full state (body, store columns, genome, lineage) of its
+              podds that left the rectangle, which the neighbour adopts
+    ghosts    the body states of its podds within WS.partition_ghost of the
+              neighbour, which the neighbour mirrors as ghost bodies
+
+Ghost bodies are ordinary dynamic bodies without userData, set back to
+their owner's state every frame, so a podd near an edge collides with the
+podds on the other side as if they shared one Box2D world. Only bodies
+cross the edges: vision and eating see the region's own food.
+'''
+import numpy as np
+
+from podd import Podd
+from rng import streams
+from settings import WorldSettings as WS
+from world import SimWorld
+
+HANDOFF_COLUMNS = ("energy", "min_energy", "age", "dead", "give_birth")  # the other store columns follow from the genome
+
+
+class RegionWorld(SimWorld):
+    name = "Region world"
+
+    def __init__(self, partition, region, inboxes, timeout=600, ghost=None):
+        '''
+        inboxes: one multiprocessing queue per region, messages to region i
+        go to inboxes[i]. A neighbour's message missing for `timeout`
+        seconds raises queue.Empty.
+        '''
+        self.partition = partition
+        self.region = region
+        self.inboxes = inboxes
+        self.timeout = timeout
+        self.ghost = WS.partition_ghost if ghost is None else ghost
+        self.neighbors = partition.neighbors(region)
+        self.first_id = region + 1  # ids stay unique across the regions
+        self.id_step = partition.regions
+        self.ghosts = {}  # {podd id: body} mirroring the neighbours' podds near the edges
+        self.pending = {}  # {(frame, region): (handoffs, ghosts)} from neighbours a frame ahead
+        self.handoffs_sent = self.handoffs_received = 0
+
+        # the food grid positions of SimWorld.add_food inside the region
+        grid = np.arange(-WS.spawn_food_box, WS.spawn_food_box + 1) / 10
+        row, col = divmod(region, partition.cols)
+        self.food_x = grid[partition.column_of(grid) == col].tolist()
+        self.food_y = grid[partition.row_of(grid) == row].tolist()
+        super(RegionWorld, self).__init__()
+
+    def populate(self):
+        # the first podds start at the origin, in the region that owns it
+        if self.partition.region_of((0, 0)) == self.region:
+            super(RegionWorld, self).populate()
+
+    def add_food(self, p=None):
+        if p:
+            self.food.add(p)
+        else:
+            self.food.add((self.food_x[streams.food.integers(len(self.food_x))], self.food_y[streams.food.integers(len(self.food_y))]))
+
+    def Step(self, settings):
+        super(RegionWorld, self).Step(settings)
+        self.exchange()
+
+    def exchange(self):
+        ''' Sends the handoffs and ghosts to every neighbour and applies theirs '''
+        slots = np.array(self.brains.order, dtype=np.intp)
+        ids = self.store.id[slots]
+        positions, _ = self.body_transforms(slots)
+        owners = self.partition.region_of(positions)
+        staying = owners == self.region
+        messages = {}
+        for neighbor in self.neighbors:
+            near = ids[staying & self.partition.near(neighbor, positions, self.ghost)].tolist()
+            messages[neighbor] = ([], np.array([self.ghost_state(id) for id in near], dtype=float).reshape(-1, 8))
+        for id, owner in zip(ids[~staying].tolist(), owners[~staying].tolist()):
+            messages[self.partition.toward(self.region, owner)][0].append(self.emigrate(id))
+            self.handoffs_sent += 1
+        for neighbor, (handoffs, ghosts) in messages.items():
+            self.inboxes[neighbor].put((self.frame_counter, self.region, handoffs, ghosts))
+
+        inbox = self.inboxes[self.region]
+        received = []
+        for neighbor in self.neighbors:
+            while (self.frame_counter, neighbor) not in self.pending:
+                frame, source, handoffs, ghosts = inbox.get(timeout=self.timeout)
+                self.pending[frame, source] = (handoffs, ghosts)
+            received.append(self.pending.pop((self.frame_counter, neighbor)))
+        for handoffs, _ in received:
+            for state in handoffs:
+                self.adopt(state)
+            self.handoffs_received += len(handoffs)
+        self.update_ghosts(np.concatenate([ghosts for _, ghosts in received]) if received else np.zeros((0, 8)))
+
+    def ghost_state(self, id):
+        fixture, podd = self.podds[id]
+        body = fixture.body
+        return (id, podd.genome["size"], *body.position, body.angle, *body.linearVelocity, body.angularVelocity)
+
+    def emigrate(self, id):
+        ''' Removes podd id from this region, returning the state adopt() rebuilds it from '''
+        fixture, podd = self.podds.pop(id)
+        body, slot = fixture.body, podd.slot
+        state = {"id": id, "parent": podd.parent, "children": podd.children, "genome": podd.genome,
+                 "columns": {name: getattr(self.store, name)[slot].item() for name in HANDOFF_COLUMNS},
+                 "previous_action": self.store.previous_action[slot].copy(),
+                 "body": (*body.position, body.angle, *body.linearVelocity, body.angularVelocity)}
+        self.pool.release(body, podd.genome["size"])
+        self.brains.remove(slot)
+        self.store.release(slot)
+        return state
+
+    def adopt(self, state):
+        ''' Takes over a podd handed off by a neighbour '''
+        id = state["id"]
+        ghost = self.ghosts.pop(id, None)
+        if ghost is not None:
+            self.world.DestroyBody(ghost)
+        x, y, angle, vx, vy, w = state["body"]
+        fixture = self.create_body(state["genome"], (x, y), angle, id)
+        fixture.body.linearVelocity = (vx, vy)
+        fixture.body.angularVelocity = w
+        podd = Podd(state["genome"], id, state["parent"], self.store)
+        podd.children = state["children"]
+        store, slot = self.store, podd.slot
+        store.stats.remove(store.traits(slot))
+        for name, value in state["columns"].items():
+            getattr(store, name)[slot] = value
+        store.previous_action[slot] = state["previous_action"]
+        store.stats.add(store.traits(slot))
+        self.podds[id] = (fixture, podd)
+        self.brains.add(slot, podd.brain)
+        # the forces of the last actions went to the body left behind
+        self.apply_moves(np.array([slot]), store.previous_action[[slot]] > 0)
+
+    def update_ghosts(self, rows):
+        ''' Moves the ghost bodies to the (id, size, x, y, angle, vx, vy, w) rows, creating and destroying them as needed '''
+        seen = set()
+        for id, size, x, y, angle, vx, vy, w in rows.tolist():
+            id = int(id)
+            seen.add(id)
+            body = self.ghosts.get(id)
+            if body is None:
+                body = self.ghosts[id] = self.world.CreateDynamicBody(position=(x, y), angle=angle, angularDamping=5, linearDamping=0.1)
+                body.CreateFixture(shape=self.pool.shape(self.pool.key(size)), density=WS.test_density, friction=0.3)
+            else:
+                body.transform = ((x, y), angle)
+            body.linearVelocity = (vx, vy)
+            body.angularVelocity = w
+        for id in self.ghosts.keys() - seen:
+            self.world.DestroyBody(self.ghosts.pop(id))
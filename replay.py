@@ -0,0 +1,258 @@
+'''
+Replay recording: the podd transforms, births, deaths and food changes of
+every frame, compact enough to record whole headless runs, and read back
+by playback.py without re-simulating anything.
+
+A replay is two files:
+
+    <name>      one zlib-compressed record per frame, appended
+    <name>.idx  int64 rows (frame, offset, length, keyframe), one per record
+
+A record holds the births (ids and sizes), the deaths, the food added and
+removed since the previous record, and the podd positions and angles as
+fixed-point integers (POSITION_SCALE, ANGLE_SCALE) delta-encoded against
+the previous record, podds in id order. Consecutive frames differ by a few
+units, which compress well. Every keyframe_interval a keyframe encodes the
+whole state against an empty world instead, so the reader can seek to any
+frame by decoding from the last keyframe before it. The reader memory-maps
+both files, a replay of a running world can be opened at any time.
+'''
+import os
+import zlib
+
+import numpy as np
+
+from settings import FrameworkSettings as FS, OutputSettings as OS, WorldSettings as WS
+from spatial import FoodGrid
+
+POSITION_SCALE = 1000  # fixed-point units per world unit (podds and food)
+ANGLE_SCALE = 10000  # per radian, angles are wrapped to [0, 2 pi)
+HEADER = 7  # frame, keyframe, podds, births, deaths, food added, food removed
+INDEX_COLUMNS = 4  # frame, offset, length, keyframe
+
+
+def index_path(path):
+    return path + ".idx"
+
+
+def quantize(positions, angles):
+    ''' (n, 3) int32 fixed-point x, y, angle '''
+    q = np.empty((len(angles), 3), dtype=np.int32)
+    q[:, :2] = np.clip(np.round(positions * POSITION_SCALE), -2**31, 2**31 - 1)
+    q[:, 2] = np.round(np.mod(angles, 2*np.pi) * ANGLE_SCALE)
+    return q
+
+
+def aligned(ids, previous_ids, previous_values):
+    ''' previous_values of the (sorted) ids that were in previous_ids, zeros for the others '''
+    values = np.zeros((len(ids),) + previous_values.shape[1:], dtype=previous_values.dtype)
+    if len(previous_ids):
+        index = np.minimum(np.searchsorted(previous_ids, ids), len(previous_ids) - 1)
+        kept = previous_ids[index] == ids
+        values[kept] = previous_values[index[kept]]
+    return values
+
+
+def food_array(points):
+    return np.round(np.array(list(points), dtype=float).reshape(-1, 2) * POSITION_SCALE).astype(np.int32)
+
+
+class ReplayWriter:
+
+    def __init__(self, path, start_frame=0, append=False):
+        '''
+        Appends to the replay at path (append=True) or starts it over. When
+        appending, records from start_frame on (left by a run resumed from
+        an earlier checkpoint) are dropped first.
+        '''
+        self.path = path
+        rows = np.zeros((0, INDEX_COLUMNS), dtype=np.int64)
+        if append and os.path.exists(path) and os.path.exists(index_path(path)):
+            rows = np.fromfile(index_path(path), dtype=np.int64)
+            rows = rows[:len(rows) // INDEX_COLUMNS * INDEX_COLUMNS].reshape(-1, INDEX_COLUMNS)
+            rows = rows[rows[:, 0] < start_frame]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = int(rows[-1, 1] + rows[-1, 2]) if len(rows) else 0
+        mode = "r+b" if len(rows) else "wb"
+        self.data = open(path, mode)
+        self.data.truncate(size)
+        self.data.seek(size)
+        self.index = open(index_path(path), mode)
+        self.index.truncate(rows.nbytes)
+        self.index.seek(rows.nbytes)
+        self.offset = size
+
+    def write(self, frame, keyframe, births, sizes, deaths, deltas, food_added, food_removed):
+        header = np.array([frame, keyframe, len(deltas), len(births), len(deaths), len(food_added), len(food_removed)], dtype=np.int64)
+        raw = b"".join((header.tobytes(), births.astype(np.int64).tobytes(), sizes.astype(np.float32).tobytes(),
+                        deaths.astype(np.int64).tobytes(), deltas.astype(np.int32).tobytes(),
+                        food_added.tobytes(), food_removed.tobytes()))
+        record = zlib.compress(raw, 1)
+        self.data.write(record)
+        self.index.write(np.array([frame, self.offset, len(record), keyframe], dtype=np.int64).tobytes())
+        self.offset += len(record)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class Recorder:
+    '''
+    Records a SimWorld: capture() at the end of every frame. The food
+    changes come from the FoodGrid change log, the births and deaths from the
+    ids of the living podds.
+    '''
+
+    def __init__(self, path, append=False, keyframe_interval=None):
+        self.path = path
+        self.append = append
+        interval = OS.replay_keyframe_interval if keyframe_interval is None else keyframe_interval
+        self.keyframe_frames = max(1, round(interval * FS.hz))
+        self.writer = None  # opened on the first capture, once the frame of a resumed world is known
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.state = np.zeros((0, 3), dtype=np.int32)
+        self.since_keyframe = 0
+        self.food_version = None
+
+    def capture(self, world):
+        food = world.food
+        if self.writer is None:
+            self.writer = ReplayWriter(self.path, world.frame_counter, self.append)
+        changes = food.changes_since(self.food_version)  # None before the first capture or after a clear
+        keyframe = changes is None or self.since_keyframe >= self.keyframe_frames
+        slots = np.array(world.brains.order, dtype=np.intp)
+        ids = world.store.id[slots]
+        order = np.argsort(ids, kind="stable")
+        ids, slots = ids[order], slots[order]
+        positions, angles = world.body_transforms(slots)
+        state = quantize(positions, angles)
+
+        if keyframe:
+            births, deaths = ids, np.zeros(0, dtype=np.int64)
+            deltas = state
+            food_added, food_removed = food_array(food.points()), food_array(())
+            self.since_keyframe = 0
+        else:
+            births = np.setdiff1d(ids, self.ids, assume_unique=True)
+            deaths = np.setdiff1d(self.ids, ids, assume_unique=True)
+            deltas = state - aligned(ids, self.ids, self.state)
+            food_added, food_removed = food_array(changes[0]), food_array(changes[1])
+        self.food_version = food.version
+        sizes = world.store.size[slots[np.searchsorted(ids, births)]] if len(births) else np.zeros(0)
+        self.writer.write(world.frame_counter, keyframe, births, sizes, deaths, deltas, food_added, food_removed)
+        if keyframe:
+            self.writer.flush()  # a reader of the running world sees up to the last keyframe at least
+        self.ids, self.state = ids, state
+        self.since_keyframe += 1
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+class Replay:
+    '''
+    Reads a replay. seek(frame) gives the world at a recorded frame as a
+    SimWorld.Snapshot()-like dict. Playing forwards decodes one record per
+    frame, jumps further than a keyframe interval (or back) start from the
+    last keyframe before the target.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.refresh()
+        self.reset()
+
+    def refresh(self):
+        ''' Maps the records written since opening (the replay of a running world grows) '''
+        data_size = os.path.getsize(self.path)
+        rows = np.fromfile(index_path(self.path), dtype=np.int64)
+        rows = rows[:len(rows) // INDEX_COLUMNS * INDEX_COLUMNS].reshape(-1, INDEX_COLUMNS)
+        self.index = rows[rows[:, 1] + rows[:, 2] <= data_size]  # a record being written has no data yet
+        self.data = np.memmap(self.path, dtype=np.uint8, mode="r") if data_size else np.zeros(0, dtype=np.uint8)
+        self.frames = self.index[:, 0]
+        self.keyframes = np.flatnonzero(self.index[:, 3])
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def first_frame(self):
+        return int(self.frames[0]) if len(self.frames) else 0
+
+    @property
+    def last_frame(self):
+        return int(self.frames[-1]) if len(self.frames) else 0
+
+    def reset(self):
+        self.record = -1  # decoded up to this record
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.sizes = np.zeros(0, dtype=np.float32)
+        self.state = np.zeros((0, 3), dtype=np.int32)
+        self.food = FoodGrid(WS.food_cell_size)  # its change log lets the renderer draw only the changes
+
+    def decode(self, record):
+        ''' Applies record number `record` to the decoded state '''
+        _, offset, length, _ = self.index[record].tolist()
+        raw = zlib.decompress(self.data[offset:offset + length])
+        frame, keyframe, n_podds, n_births, n_deaths, n_added, n_removed = np.frombuffer(raw, dtype=np.int64, count=HEADER).tolist()
+        position = HEADER * 8
+
+        def take(dtype, count, shape=()):
+            nonlocal position
+            array = np.frombuffer(raw, dtype=dtype, count=count * int(np.prod(shape, dtype=int)), offset=position)
+            position += array.nbytes
+            return array.reshape((count,) + shape)
+
+        births, sizes = take(np.int64, n_births), take(np.float32, n_births)
+        deaths = take(np.int64, n_deaths)
+        deltas = take(np.int32, n_podds, (3,))
+        added, removed = take(np.int32, n_added, (2,)), take(np.int32, n_removed, (2,))
+
+        if keyframe:
+            previous_ids, previous_sizes, previous_state = births[:0], sizes[:0], self.state[:0]
+            self.food.clear()
+        else:
+            previous_ids, previous_sizes, previous_state = self.ids, self.sizes, self.state
+        ids = np.union1d(np.setdiff1d(previous_ids, deaths, assume_unique=True), births)
+        self.sizes = aligned(ids, previous_ids, previous_sizes)
+        if len(births):
+            self.sizes[np.searchsorted(ids, births)] = sizes
+        self.state = aligned(ids, previous_ids, previous_state) + deltas
+        self.ids = ids
+        for p in map(tuple, (removed / POSITION_SCALE).tolist()):
+            self.food.discard(p)
+        for p in map(tuple, (added / POSITION_SCALE).tolist()):
+            self.food.add(p)
+        self.record = record
+
+    def seek(self, frame):
+        ''' The recorded world at the last recorded frame <= frame, as a Snapshot() dict '''
+        if not len(self.index):
+            return None
+        target = max(int(np.searchsorted(self.frames, frame, side="right")) - 1, 0)
+        keyframe = self.keyframes[max(int(np.searchsorted(self.keyframes, target, side="right")) - 1, 0)]
+        if target < self.record or keyframe > self.record:
+            self.record = keyframe - 1  # start over from the keyframe
+        for record in range(self.record + 1, target + 1):
+            self.decode(record)
+        return self.snapshot()
+
+    def snapshot(self):
+        return {
+            "frame": int(self.frames[self.record]),
+            "ids": self.ids,
+            "positions": self.state[:, :2] / POSITION_SCALE,
+            "angles": self.state[:, 2] / ANGLE_SCALE,
+            "scales": np.sqrt(self.sizes),
+            "awake": np.ones(len(self.ids), dtype=bool),
+            "food": self.food,
+        }
@@ -0,0 +1,92 @@
+'''
+Random streams of the simulation.
+
+Every subsystem draws from its own NumPy Generator, all spawned from one
+seed, so the draws of one subsystem never shift when another draws more or
+less (eg. the mutation stream is not disturbed by the number of podds
+drawing noise). Draws come out of blocks generated in bulk, so a single
+value costs an array lookup instead of a call into the generator.
+
+    noise     the noise brain input, every podd every frame
+    death     the age death rolls, every podd every frame
+    mutation  Podd.new_genome and BrainGenome.mutate
+    spawn     the heading of new podds
+    food      the position of new food
+
+`streams` is shared by the whole process, SimWorld seeds it.
+'''
+import numpy as np
+
+from settings import WorldSettings as WS
+
+SUBSYSTEMS = ("noise", "death", "mutation", "spawn", "food")
+
+
+class Stream:
+    ''' A Generator handing out uniforms and standard normals from blocks of WS.rng_block values '''
+
+    def __init__(self, seed=None, block=None):
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.block = WS.rng_block if block is None else block
+        self.buffers = {"uniform": np.empty(0), "normal": np.empty(0)}
+        self.positions = {"uniform": 0, "normal": 0}
+
+    def _take(self, kind, n):
+        buffer, position = self.buffers[kind], self.positions[kind]
+        if position + n > len(buffer):
+            fresh = self.generator.random(max(self.block, n)) if kind == "uniform" else self.generator.standard_normal(max(self.block, n))
+            buffer = self.buffers[kind] = np.concatenate((buffer[position:], fresh))
+            position = 0
+        self.positions[kind] = position + n
+        return buffer[position:position + n]
+
+    def random(self, n=None):
+        ''' A float in [0, 1), or an array of n '''
+        if n is None:
+            return float(self._take("uniform", 1)[0])
+        return self._take("uniform", n).copy()
+
+    def normal(self, loc=0.0, scale=1.0, n=None):
+        if n is None:
+            return loc + scale * float(self._take("normal", 1)[0])
+        return loc + scale * self._take("normal", n)
+
+    def integers(self, high):
+        ''' An int in [0, high) '''
+        return int(self._take("uniform", 1)[0] * high)
+
+    def get_state(self):
+        return {"generator": self.generator.bit_generator.state,
+                "buffers": {kind: buffer[self.positions[kind]:].copy() for kind, buffer in self.buffers.items()}}
+
+    def set_state(self, state):
+        self.generator.bit_generator.state = state["generator"]
+        self.buffers = {kind: buffer.copy() for kind, buffer in state["buffers"].items()}
+        self.positions = dict.fromkeys(self.buffers, 0)
+
+
+class RandomStreams:
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        '''
+        Restarts every stream from `seed`. With None the seed is drawn from
+        np.random, so seeding np.random (as ensemble runs do) still makes a
+        run reproducible.
+        '''
+        if seed is None:
+            seed = int(np.random.randint(2**63, dtype=np.int64))
+        for name, seed_sequence in zip(SUBSYSTEMS, np.random.SeedSequence(seed).spawn(len(SUBSYSTEMS))):
+            setattr(self, name, Stream(seed_sequence))
+
+    def get_state(self):
+        return {name: getattr(self, name).get_state() for name in SUBSYSTEMS}
+
+    def set_state(self, state):
+        for name in SUBSYSTEMS:
+            getattr(self, name).set_state(state[name])
+
+
+streams = RandomStreams()
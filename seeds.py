@@ -0,0 +1,139 @@
+'''
+Seed brain genomes for new worlds.
+
+A pool is grown by evolving from an empty brain: `parents` empty genomes,
+then for every generation `selected` of them are picked at random and each
+gets `children` mutated children, which form the next generation. Larger
+pools are made of independent lineages (one lineage gives selected *
+children genomes), evolved in parallel on a process pool and each seeded
+from the pool seed, so a pool does not depend on the number of workers.
+
+Pools are stored in the seed cache directory, keyed by the generation
+parameters, the mutation settings and the seed, and loaded from there on
+the next start.
+
+python seeds.py 50000 --workers 8  # generate (and cache) a pool of 50000 genomes
+'''
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from genome import BrainGenome
+from rng import Stream
+from settings import BrainSettings as BS
+from utils import get_logger
+
+logger = get_logger(__name__, "SEEDS")
+
+CACHE_VERSION = 2
+MUTATION_SETTINGS = ("n_inputs", "n_outputs", "max_node", "chance_new", "chance_del", "mut_sd", "min_mut_weight")
+
+
+def evolve_lineage(seed, generations, parents, selected, children):
+    ''' One lineage, as (src, tgt, weight, offsets) of its last generation '''
+    rng = Stream(seed)
+    pop = [BrainGenome() for _ in range(parents)]
+    for _ in range(generations):
+        picked = rng.generator.choice(len(pop), min(selected, len(pop)), replace=False)
+        pop = [pop[i].mutate(rng) for i in picked.tolist() for _ in range(children)]
+    return pack(pop)
+
+
+def pack(genomes):
+    ''' Genomes as concatenated (src, tgt, weight) arrays and the offsets where each genome starts '''
+    lengths = [len(genome) for genome in genomes]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if not genomes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), offsets
+    return (np.concatenate([genome.src for genome in genomes]), np.concatenate([genome.tgt for genome in genomes]),
+            np.concatenate([genome.weight for genome in genomes]), offsets)
+
+
+def unpack(src, tgt, weight, offsets):
+    return [BrainGenome(src[start:stop], tgt[start:stop], weight[start:stop])
+            for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def _init_worker(mutation_settings):
+    # spawned workers start from the default settings
+    for name, value in mutation_settings.items():
+        setattr(BS, name, value)
+
+
+def _evolve(task):
+    return evolve_lineage(*task)
+
+
+def cache_path(count, generations, parents, selected, children, seed, cache_dir):
+    params = {"version": CACHE_VERSION, "count": count, "generations": generations, "parents": parents,
+              "selected": selected, "children": children, "seed": seed,
+              **{name: getattr(BS, name) for name in MUTATION_SETTINGS}}
+    key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"seeds-{count}-{key}.npz")
+
+
+def seed_genomes(count, generations=None, parents=None, selected=None, children=None, seed=None, workers=None, cache_dir=None):
+    '''
+    `count` seed BrainGenomes, from the seed cache if this pool was made
+    before. Arguments left as None come from BrainSettings (seed_*).
+    workers: processes for the lineages, 0 = one per CPU, 1 = in this process
+    cache_dir: "" disables the cache
+    '''
+    generations = BS.seed_generations if generations is None else generations
+    parents = BS.seed_parents if parents is None else parents
+    selected = BS.seed_selected if selected is None else selected
+    children = BS.seed_children if children is None else children
+    seed = BS.seed_random_seed if seed is None else seed
+    workers = BS.seed_workers if workers is None else workers
+    cache_dir = BS.seed_cache if cache_dir is None else cache_dir
+
+    path = cache_path(count, generations, parents, selected, children, seed, cache_dir) if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as saved:
+            genomes = unpack(saved["src"], saved["tgt"], saved["weight"], saved["offsets"])
+        logger.info("Loaded %s seed genomes from %s", len(genomes), path)
+        return genomes
+
+    t_start = time.time()
+    lineage_size = min(selected, parents) * children if generations else parents
+    n_lineages = max(1, -(-count // lineage_size))
+    lineage_seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n_lineages)]
+    tasks = [(s, generations, parents, selected, children) for s in lineage_seeds]
+    workers = min(workers or os.cpu_count() or 1, n_lineages)
+    if workers > 1:
+        mutation_settings = {name: getattr(BS, name) for name in MUTATION_SETTINGS}
+        # spawn: fork would copy the parent's pygame/Box2D state into every worker
+        with mp.get_context("spawn").Pool(workers, _init_worker, (mutation_settings,)) as pool:
+            lineages = pool.map(_evolve, tasks)
+    else:
+        lineages = [_evolve(task) for task in tasks]
+    pool_genomes = [genome for lineage in lineages for genome in unpack(*lineage)]
+    picked = np.random.default_rng(seed).choice(len(pool_genomes), count, replace=False)
+    genomes = [pool_genomes[i] for i in picked.tolist()]
+    logger.info("Generated %s seed genomes (%s lineages, %s workers) in %.2fs", count, n_lineages, workers, time.time() - t_start)
+
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        src, tgt, weight, offsets = pack(genomes)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, src=src, tgt=tgt, weight=weight, offsets=offsets)
+        os.replace(tmp_path, path)  # a concurrent start never loads half a pool
+    return genomes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and cache a pool of seed brain genomes")
+    parser.add_argument("count", type=int, help="number of genomes")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: BrainSettings.seed_workers, 0 = all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="pool seed (default: BrainSettings.seed_random_seed)")
+    parser.add_argument("--generations", type=int, default=None)
+    parser.add_argument("--cache", default=None, help="cache directory (default: BrainSettings.seed_cache)")
+    args = parser.parse_args()
+    genomes = seed_genomes(args.count, args.generations, seed=args.seed, workers=args.workers, cache_dir=args.cache)
+    lengths = [len(genome) for genome in genomes]
+    print(f"{len(genomes)} genomes, {np.mean(lengths):.2f} connections on average (max {max(lengths, default=0)})")
@@ -26,6 +26,8 @@ class FrameworkSettings:
     drawMenu = True             # toggle by pressing F1
     drawCOMs = False            # Centers of mass
     pointSize = 2.0             # pixel radius for drawing points
+    sprite_rendering = True     # draw food and podds from cached sprites (debug overlays fall back to the debug draw)
+    sprite_angles = 64          # heading steps of the cached podd sprites
 
     # Miscellaneous testbed options
     pause = False
@@ -34,6 +36,19 @@ class FrameworkSettings:
     # testing)
     onlyInit = False
 
+    # Headless mode: no pygame, no drawing and no frame throttling. The world
+    # is stepped as fast as the CPU allows until one of the limits is reached
+    headless = False
+    headless_frames = None  # max number of frames to step (None = no limit)
+    headless_time_limit = None  # max wall-clock seconds to run (None = no limit)
+    headless_report_interval = 10.0  # wall-clock seconds between steps/sec reports
+
+    # Decoupled mode: the simulation runs on its own thread at sim_speed, the
+    # window renders the latest snapshot at render_fps
+    decoupled = False
+    sim_speed = 10.0  # simulated seconds per real second (0 = as fast as possible)
+    render_fps = 30
+
     # Initial view options
     zoom = 5.5  # smaller = zoom out
     window_size = (1280, 720)
@@ -49,6 +64,16 @@ class WorldSettings:
     init_food = 200
     max_food = 4000
     food_energy = 18  # can be genetically determined in the future
+    food_radius = 0.25  # drawn radius, also the size seen by podd vision
+    food_cell_size = 2.0  # side of the food index grid cells, in world units
+    body_pool_size = 256  # bodies of dead podds kept for reuse by births (bodypool.py)
+    shape_bucket = 0.01  # podd body half-widths are rounded to multiples of this, so similar sizes share shapes and bodies (0 = exact)
+    contact_events = False  # hand podd-podd contact begin/end events to SimWorld.ContactEvents every frame (registers the Python contact listener)
+    partition_ghost = 4.0  # width of the band along region edges whose podds are mirrored into the neighbouring regions (partition.py), more than a podd's extent
+
+    # random streams (rng.py)
+    random_seed = None  # None = drawn from np.random (seeded per run by ensemble.py)
+    rng_block = 4096  # values generated at once per stream
 
     # sunlight
     sunlight_energy = 16 / FrameworkSettings.hz
@@ -90,10 +115,28 @@ class PoddSettings:
     mut_sd = 0.05  # variance in mutation
 
 class BrainSettings:
+    # vision: rays cast in a cone around the podd's heading, each gives a distance and a colour input
+    vision_rays = 32  # 0 = blind
+    vision_range = 10.0  # world units
+    vision_field = 1.6  # radians, width of the cone
+    vision_food_colour = 1.0
+    vision_podd_colour = -1.0
+
     # nodes
-    n_inputs = 6
+    n_internal_inputs = 6  # energy, 3 previous actions, noise, bias
+    n_inputs = n_internal_inputs + 2 * vision_rays  # internal inputs first, then vision distances and colours
     n_outputs = 3
     max_node = 9999
+    topology_cache_size = 4096  # compiled brain topologies kept for reuse by other brains with the same connections
+
+    # seed genomes (seeds.py): evolved from an empty brain, cached on disk
+    seed_generations = 8
+    seed_parents = 50  # size of the first generation
+    seed_selected = 20  # genomes picked as parents in every generation
+    seed_children = 20  # children per picked parent
+    seed_random_seed = 0
+    seed_workers = 0  # processes generating a pool, 0 = one per CPU
+    seed_cache = "seed_cache"  # directory of generated pools, "" = always regenerate
 
     # mutation chance
     chance_new = 0.25  # chance at each new_genome of creating a new connection
@@ -101,4 +144,38 @@ class BrainSettings:
     
     # mutation strength: adjusting weights
     mut_sd = 0.05
-    min_mut_weight = 0.001  # if abs(weight) of connection is less than this number, any mutation will continue assuming this minimum value of weight (prevent 0 weight problem)
\ No newline at end of file
+    min_mut_weight = 0.001  # if abs(weight) of connection is less than this number, any mutation will continue assuming this minimum value of weight (prevent 0 weight problem)
+
+class OutputSettings:
+    # census and history records
+    directory = "."  # where history/census (and the sqlite database) are written
+    backend = "csv"  # csv: ';'-delimited text files, sqlite: one table per record type in evosim.sqlite
+    flush_interval = 1.0  # seconds between background flushes
+    max_buffer = 10000  # records buffered before an early flush is triggered
+    lineage_file = "lineage.sqlite"  # in directory: births and deaths for ancestry queries (lineage.py), "" = off
+
+    # checkpoints of the full world state, written in the background
+    checkpoint_interval = 0  # simulated seconds between checkpoints (0 = off)
+    checkpoint_file = "checkpoint.evo"  # in directory
+
+    # replay of the podd transforms, births, deaths and food of every frame, for playback.py (replay.py)
+    replay_file = ""  # in directory, "" = off
+    replay_keyframe_interval = 10  # simulated seconds between keyframes, playback seeks from the last one before the target
+
+    # frame timing
+    metrics_interval = 10  # simulated seconds between exports of the per-phase frame timings (0 = off)
+    metrics_format = "csv"  # csv: rows appended to metrics.csv, prometheus: metrics.prom rewritten on every export
+    metrics_window = 1000  # frames the timing percentiles are computed over
+
+    # population statistics, kept up to date on every birth, death and energy change (stats.py)
+    stats_interval = 1.0  # simulated seconds between population_stats samples (1/FrameworkSettings.hz = every frame, 0 = off)
+    trait_bins = {"energy": (0, 80, 16), "size": (0, 5, 20), "strength": (0, 5, 20), "complexity": (0, 50, 25)}  # {trait: (low, high, bins)}
+
+class LogSettings:
+    log_file = "logs/evosim.log"
+    max_bytes = 10000000  # rotate the log file at this size
+    backup_count = 10
+    console = True  # echo log records to stdout
+    level = "INFO"  # level of module loggers without a subsystem
+    # per-subsystem levels: set to "DEBUG" for verbose output (eg. every food hit) or "WARNING" to silence
+    levels = {"WORLD": "INFO", "BIRTH": "INFO", "DEATH": "INFO", "STATS": "INFO"}
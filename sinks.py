@@ -0,0 +1,185 @@
+'''
+Output sinks for census and history records.
+
+Records are buffered in memory and written in batches by a background
+thread, so the simulation thread never waits on file I/O.
+'''
+import atexit
+import os
+import sqlite3
+import threading
+
+
+class CSVSink:
+    ''' Delimited text file, one line per record '''
+
+    def __init__(self, path, columns, delimiter=";", append=False):
+        self.path = path
+        self.delimiter = delimiter
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "w" if new_file else "a")
+        if new_file:
+            self.file.write(delimiter.join(columns) + "\n")
+            self.file.flush()
+
+    def discard_after(self, column, value):
+        ''' Removes the lines whose `column` is above value (and an unfinished last line) '''
+        self.file.close()
+        with open(self.path) as f:
+            lines = f.read().split("\n")
+        index = lines[0].split(self.delimiter).index(column)
+        kept = [lines[0]]
+        for line in lines[1:-1]:  # the last one is "" after a complete last line
+            try:
+                if float(line.split(self.delimiter, index + 1)[index]) <= value:
+                    kept.append(line)
+            except (IndexError, ValueError):
+                pass
+        with open(self.path, "w") as f:
+            f.write("".join(line + "\n" for line in kept))
+        self.file = open(self.path, "a")
+
+    def write_many(self, records):
+        self.file.write("".join(self.delimiter.join([f"{value}" for value in record]) + "\n" for record in records))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink:
+    ''' One table per record type in a SQLite database, one row per record '''
+
+    def __init__(self, path, table, columns, append=False):
+        self.path = path
+        self.table = table
+        # written from the flush thread, access is serialized by BufferedSink
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if not append:
+            self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)})")
+        self.connection.commit()
+        self.insert = f"INSERT INTO {table} VALUES ({', '.join(['?'] * len(columns))})"
+
+    def write_many(self, records):
+        self.connection.executemany(self.insert, [[value if isinstance(value, (int, float, str, type(None))) else f"{value}"
+                                                   for value in record] for record in records])
+        self.connection.commit()
+
+    def discard_after(self, column, value):
+        self.connection.execute(f"DELETE FROM {self.table} WHERE {column} > ?", (value,))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class BufferedSink:
+    '''
+    Buffers records in memory and hands them to `sink` in batches from a
+    background thread, every `flush_interval` seconds or as soon as
+    `max_buffer` records are waiting. Remaining records are flushed on
+    close(), which also runs at interpreter exit (including after a crash).
+    An error writing from the background thread stops it and is raised by
+    the next write() or close(), on the caller's thread.
+    '''
+
+    def __init__(self, sink, flush_interval=1.0, max_buffer=10000):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = []
+        self.lock = threading.Lock()  # guards buffer
+        self.io_lock = threading.Lock()  # keeps batches in order
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.error = None  # raised by the background thread, re-raised on the caller's
+        self.error_raised = False
+        self.thread = threading.Thread(target=self._run, name=f"sink-{os.path.basename(sink.path)}", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def write(self, *record):
+        if self.error is not None:
+            self._raise_error()  # every time: the records would be lost
+        with self.lock:
+            self.buffer.append(record)
+            full = len(self.buffer) >= self.max_buffer
+        if full:
+            self.wakeup.set()
+
+    def flush(self):
+        with self.io_lock:
+            with self.lock:
+                records, self.buffer = self.buffer, []
+            if records:
+                self.sink.write_many(records)
+
+    def discard_after(self, column, value):
+        ''' Drops the written records whose `column` is above value, eg. the ones written after a checkpoint '''
+        self.flush()
+        with self.io_lock:
+            self.sink.discard_after(column, value)
+
+    def _run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.error = e
+                return
+
+    def _raise_error(self):
+        self.error_raised = True
+        raise self.error
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.thread.join()
+        try:
+            if self.error is None:
+                self.flush()
+        finally:
+            self.sink.close()
+            atexit.unregister(self.close)
+        if self.error is not None and not self.error_raised:
+            self._raise_error()
+
+
+def open_sink(name, columns, backend="csv", directory=".", delimiter=";", flush_interval=1.0, max_buffer=10000, append=False):
+    '''
+    Returns a BufferedSink for the record type `name`: `name`.csv with the csv
+    backend or table `name` of evosim.sqlite with the sqlite backend.
+    Existing records are kept with append=True (eg. when resuming a run).
+    '''
+    if backend == "csv":
+        sink = CSVSink(os.path.join(directory, f"{name}.csv"), columns, delimiter, append)
+    elif backend == "sqlite":
+        sink = SQLiteSink(os.path.join(directory, "evosim.sqlite"), name, columns, append)
+    else:
+        raise ValueError(f"Unknown output backend: {backend}")
+    return BufferedSink(sink, flush_interval, max_buffer)
+
+
+def read_records(name, backend="csv", directory=".", delimiter=";"):
+    '''
+    Reads back the records written by open_sink(name, ...).
+    Returns (columns, rows), values are strings for the csv backend.
+    '''
+    if backend == "csv":
+        with open(os.path.join(directory, f"{name}.csv")) as f:
+            lines = f.read().splitlines()
+        return lines[0].split(delimiter), [line.split(delimiter) for line in lines[1:]]
+    elif backend == "sqlite":
+        connection = sqlite3.connect(os.path.join(directory, "evosim.sqlite"))
+        try:
+            cursor = connection.execute(f"SELECT * FROM {name}")
+            return [column[0] for column in cursor.description], cursor.fetchall()
+        finally:
+            connection.close()
+    raise ValueError(f"Unknown output backend: {backend}")
@@ -0,0 +1,138 @@
+'''
+Uniform grid index for food pellets.
+'''
+from collections import deque
+from math import floor
+
+LOG_SIZE = 4096  # latest changes a FoodGrid remembers for changes_since()
+
+
+class FoodGrid:
+    '''
+    Set of food positions bucketed into square cells of `cell_size`, so that
+    only the pellets near an AABB have to be point-tested.
+
+    Behaves like the plain set of (x, y) tuples it replaces: supports add,
+    remove, discard, len, iteration and membership tests. The latest changes
+    are logged, so readers that keep a copy (the sprite renderer, replay
+    recording) can catch up by the changes only.
+    '''
+
+    def __init__(self, cell_size, points=()):
+        self.cell_size = cell_size
+        self.cells = {}  # {(cx, cy): set of (x, y)}
+        self.count = 0
+        self.version = 0  # bumped on every change, lets readers cache derived arrays
+        self.log = deque(maxlen=LOG_SIZE)  # (version, p, added) of the latest changes
+        for p in points:
+            self.add(p)
+
+    def cell(self, p):
+        return (floor(p[0] / self.cell_size), floor(p[1] / self.cell_size))
+
+    def add(self, p):
+        bucket = self.cells.setdefault(self.cell(p), set())
+        if p not in bucket:
+            bucket.add(p)
+            self.count += 1
+            self.version += 1
+            self.log.append((self.version, p, True))
+
+    def remove(self, p):
+        key = self.cell(p)
+        bucket = self.cells[key]  # KeyError like set.remove if the cell is empty
+        bucket.remove(p)
+        self.count -= 1
+        self.version += 1
+        self.log.append((self.version, p, False))
+        if not bucket:
+            del self.cells[key]
+
+    def discard(self, p):
+        if p in self:
+            self.remove(p)
+
+    def query(self, lower, upper):
+        '''
+        Returns the pellets in every cell overlapping the box lower-upper.
+        Candidates still need an exact test against the shape.
+        '''
+        x0, y0 = self.cell(lower)
+        x1, y1 = self.cell(upper)
+        cells = self.cells
+        candidates = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    candidates.extend(bucket)
+        return candidates
+
+    def points(self):
+        ''' All pellets as a new set, faster than set(grid) '''
+        return set().union(*self.cells.values())
+
+    def changes_since(self, version):
+        '''
+        (added, removed) pellet sets from `version` to now, a pellet added and
+        removed again in between is in neither. None when the log does not go
+        back that far (or the grid was cleared since).
+        '''
+        if version == self.version:
+            return set(), set()
+        if version is None or version > self.version or not self.log or self.log[0][0] > version + 1:
+            return None
+        recent = []  # newest first, only the changes after version are walked
+        for entry in reversed(self.log):
+            if entry[0] <= version:
+                break
+            recent.append(entry)
+        changes = {}
+        for _, p, added in reversed(recent):
+            if changes.get(p, added) != added:
+                del changes[p]
+            else:
+                changes[p] = added
+        return {p for p, added in changes.items() if added}, {p for p, added in changes.items() if not added}
+
+    def clear(self):
+        self.cells.clear()
+        self.count = 0
+        self.version += 1
+        self.log.clear()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for bucket in self.cells.values():
+            yield from bucket
+
+    def __contains__(self, p):
+        bucket = self.cells.get(self.cell(p))
+        return bucket is not None and p in bucket
+
+
+class FoodSnapshot:
+    '''
+    Frozen copy of the pellets of a FoodGrid, safe to read from another
+    thread while the grid keeps changing. Keeps the changes since the
+    `previous` snapshot, so a reader that had that one catches up by them.
+    '''
+
+    def __init__(self, grid, previous=None):
+        self.version = grid.version
+        self._points = grid.points()
+        self.base_version = previous.version if previous is not None else None
+        self.changes = grid.changes_since(self.base_version)
+
+    def points(self):
+        return self._points
+
+    def changes_since(self, version):
+        if version == self.version:
+            return set(), set()
+        return self.changes if version == self.base_version else None
+
+    def __len__(self):
+        return len(self._points)
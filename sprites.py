@@ -0,0 +1,162 @@
+'''
+Sprite based drawing of the food and the podds.
+
+The debug draw path costs one Python callback and two pygame draw calls per
+pellet and per body. Here pellets live on a food layer surface that is only
+touched where food was added or eaten (and redrawn when the view moves),
+so a frame costs one blit of the layer whatever the number of pellets, and
+catching up costs the number of changes (from the food's change log).
+Podds are blitted in one batch from pre-rendered sprites, cached by
+on-screen size, heading (quantized to FS.sprite_angles steps) and awake
+state.
+'''
+from math import ceil, cos, sin, pi
+
+import numpy as np
+import pygame
+
+from settings import FrameworkSettings as FS, WorldSettings as WS
+
+FOOD_COLOUR = (0, 255, 0)
+AWAKE_COLOUR = (230, 179, 179)  # the debug draw colours of dynamic bodies
+ASLEEP_COLOUR = (153, 153, 153)
+COLOURKEY = (0, 0, 0)  # transparent on the food layer
+MAX_SPRITES = 4096  # cached podd sprites before the cache is cleared
+
+
+class SpriteRenderer:
+    '''
+    Draws for a CustomFramework `test`, using its current view (zoom, offset
+    and screen size).
+    '''
+
+    def __init__(self, test, n_angles=None):
+        self.test = test
+        self.n_angles = FS.sprite_angles if n_angles is None else n_angles
+        self.sprites = {}  # {(scale in half pixels, angle step, awake): (surface, anchor)}
+        self.food_layer = None
+        self.food_view = None  # view the layer was drawn for
+        self.food_version = None
+        self.food_cells = {}  # {(cx, cy): pellets drawn in that pellet-sized screen cell}, to find overlaps
+        self.pellet = None
+
+    def view(self):
+        test = self.test
+        return (test.viewZoom, test.viewOffset.x, test.viewOffset.y, test.screenSize.x, test.screenSize.y)
+
+    def to_screen(self, points):
+        ''' (n, 2) world points to (n, 2) screen pixels, like b2DrawExtended.to_screen '''
+        zoom, offset_x, offset_y, _, height = self.view()
+        screen = np.asarray(points, dtype=float).reshape(-1, 2) * zoom
+        screen[:, 0] -= offset_x
+        screen[:, 1] = height - (screen[:, 1] - offset_y)
+        return screen
+
+    ### food ###
+
+    def draw_food(self, surface, food):
+        '''
+        Blits the food layer, bringing it up to date with `food` first.
+        food: anything with .version, .points() and .changes_since(version),
+        a FoodGrid or a FoodSnapshot
+        '''
+        view = self.view()
+        if view != self.food_view:
+            self._redraw_food(food, view)
+        elif food.version != self.food_version:
+            self._update_food(food)
+        surface.blit(self.food_layer, (0, 0))
+
+    def _redraw_food(self, food, view):
+        zoom, _, _, width, height = view
+        radius = max(1, int(WS.food_radius * zoom))
+        self.pellet = pygame.Surface((2*radius + 1, 2*radius + 1), pygame.SRCALPHA)
+        pygame.draw.circle(self.pellet, (0, 127, 0, 127), (radius, radius), radius, 0)
+        pygame.draw.circle(self.pellet, FOOD_COLOUR, (radius, radius), radius, 1)
+        self.pellet_radius = radius
+        self.food_layer = pygame.Surface((int(width), int(height))).convert()
+        self.food_layer.set_colorkey(COLOURKEY)
+        self.food_view = view
+        self.food_cells = {}
+        self.food_layer.fill(COLOURKEY)
+        self._blit_pellets(food.points())
+        self.food_version = food.version
+
+    def _update_food(self, food):
+        changes = food.changes_since(self.food_version)
+        if changes is None:  # too far behind the change log
+            self._redraw_food(food, self.food_view)
+            return
+        added, removed = changes
+        if removed:
+            # erase the eaten pellets, then redraw the ones they overlapped
+            radius, size = self.pellet_radius, 2*self.pellet_radius + 1
+            cells = self.food_cells
+            overlapped = set()
+            for p, (x, y) in zip(removed, self.to_screen(list(removed)).tolist()):
+                x, y = int(x), int(y)
+                self.food_layer.fill(COLOURKEY, (x - radius, y - radius, size, size))
+                cx, cy = x // size, y // size
+                cells.get((cx, cy), set()).discard(p)
+                for dx in (-1, 0, 1):
+                    for dy in (-1, 0, 1):
+                        overlapped.update(cells.get((cx + dx, cy + dy), ()))
+            self._blit_pellets(overlapped)
+        self._blit_pellets(added)
+        self.food_version = food.version
+
+    def _blit_pellets(self, points):
+        if not points:
+            return
+        pellet, radius = self.pellet, self.pellet_radius
+        size = 2*radius + 1
+        cells = self.food_cells
+        batch = []
+        for p, (x, y) in zip(points, self.to_screen(list(points)).tolist()):
+            x, y = int(x), int(y)
+            cells.setdefault((x // size, y // size), set()).add(p)
+            batch.append((pellet, (x - radius, y - radius)))
+        self.food_layer.blits(batch, doreturn=False)
+
+    ### podds ###
+
+    def draw_podds(self, surface, positions, angles, scales, awake):
+        '''
+        Blits all podds in one batch.
+        positions, angles, scales: (n, 2), (n,) and (n,) body transforms and half-widths
+        awake: (n,) bool
+        '''
+        if len(positions) == 0:
+            return
+        zoom = self.view()[0]
+        screen = self.to_screen(positions)
+        steps = np.round(np.asarray(angles) * self.n_angles / (2*pi)).astype(np.intp) % self.n_angles
+        half_pixels = np.maximum(np.round(np.asarray(scales) * zoom * 2), 1).astype(np.intp)
+        if len(self.sprites) > MAX_SPRITES:
+            self.sprites.clear()
+        sprites = self.sprites
+        batch = []
+        for (x, y), key in zip(screen.tolist(), zip(half_pixels.tolist(), steps.tolist(), np.asarray(awake).tolist())):
+            sprite = sprites.get(key)
+            if sprite is None:
+                sprite = sprites[key] = self._podd_sprite(*key)
+            image, anchor = sprite
+            batch.append((image, (int(x) - anchor, int(y) - anchor)))
+        surface.blits(batch, doreturn=False)
+
+    def _podd_sprite(self, half_pixels, step, awake):
+        ''' The podd triangle (0, 0), (-s, -s), (s, -s) at angle step, s in screen pixels '''
+        s = half_pixels / 2
+        anchor = ceil(s * 2**0.5) + 1  # body origin in the sprite, the corners are s*sqrt(2) away
+        angle = 2*pi * step / self.n_angles
+        c, si = cos(angle), sin(angle)
+        # rotate in world coordinates, then flip y for the screen
+        vertices = [(anchor + c*x - si*y, anchor - (si*x + c*y)) for x, y in ((0, 0), (-s, -s), (s, -s))]
+        image = pygame.Surface((2*anchor + 1, 2*anchor + 1)).convert()
+        image.fill(COLOURKEY)
+        image.set_colorkey(COLOURKEY)
+        colour = AWAKE_COLOUR if awake else ASLEEP_COLOUR
+        # the debug draw fill (half colour at half alpha) as it comes out on the black background
+        pygame.draw.polygon(image, tuple(v // 4 for v in colour), vertices, 0)
+        pygame.draw.polygon(image, colour, vertices, 1)
+        return image, anchor
@@ -0,0 +1,104 @@
+'''
+Running population statistics.
+
+PopulationStats keeps, for every tracked trait, the sum, the sum of squares
+and a fixed-bin histogram over the living podds. The PoddStore updates them
+on every birth, death and energy change with the old and new values only,
+so the means, standard deviations and distributions can be sampled every
+frame without a pass over the population.
+'''
+from math import floor
+
+import numpy as np
+
+from settings import OutputSettings as OS
+
+
+class PopulationStats:
+
+    def __init__(self, bins=None):
+        '''
+        bins: {trait: (low, high, n_bins)}, values outside [low, high) are
+        counted in the first or last bin. Default OutputSettings.trait_bins.
+        '''
+        bins = OS.trait_bins if bins is None else bins
+        self.bins = {trait: (float(low), float(high), int(n)) for trait, (low, high, n) in bins.items()}
+        self.traits = list(self.bins)
+        self.count = 0
+        self.sum = dict.fromkeys(self.traits, 0.0)
+        self.sumsq = dict.fromkeys(self.traits, 0.0)
+        self.histogram = {trait: np.zeros(n, dtype=np.int64) for trait, (_, _, n) in self.bins.items()}
+
+    def bin(self, trait, values):
+        low, high, n = self.bins[trait]
+        return np.clip(np.floor((np.asarray(values, dtype=float) - low) * (n / (high - low))), 0, n - 1).astype(np.intp)
+
+    def bin_one(self, trait, value):
+        ''' bin() of one float, without the NumPy call overhead '''
+        low, high, n = self.bins[trait]
+        return min(max(floor((value - low) * (n / (high - low))), 0), n - 1)
+
+    def add(self, values):
+        ''' A podd is born. values: {trait: value} '''
+        self.count += 1
+        for trait in self.traits:
+            value = float(values[trait])
+            self.sum[trait] += value
+            self.sumsq[trait] += value * value
+            self.histogram[trait][self.bin_one(trait, value)] += 1
+
+    def remove(self, values):
+        ''' A podd dies. values: {trait: value} '''
+        self.count -= 1
+        for trait in self.traits:
+            value = float(values[trait])
+            self.sum[trait] -= value
+            self.sumsq[trait] -= value * value
+            self.histogram[trait][self.bin_one(trait, value)] -= 1
+
+    def change(self, trait, old, new):
+        ''' Living podds' trait went from old to new (scalars or arrays of the same length) '''
+        if trait not in self.bins:
+            return
+        if np.ndim(old) == 0:
+            old, new = float(old), float(new)
+            self.sum[trait] += new - old
+            self.sumsq[trait] += new*new - old*old
+            histogram = self.histogram[trait]
+            histogram[self.bin_one(trait, old)] -= 1
+            histogram[self.bin_one(trait, new)] += 1
+            return
+        old, new = np.asarray(old, dtype=float), np.asarray(new, dtype=float)
+        if old.size == 0:
+            return
+        self.sum[trait] += (new - old).sum()
+        self.sumsq[trait] += (new*new - old*old).sum()
+        n = self.bins[trait][2]
+        self.histogram[trait] += np.bincount(self.bin(trait, new), minlength=n) - np.bincount(self.bin(trait, old), minlength=n)
+
+    def resync(self, values):
+        '''
+        Recomputes everything from {trait: array of the values of all living
+        podds}, which also drops the rounding error the running sums pick up
+        over a long run.
+        '''
+        self.count = len(values[self.traits[0]]) if self.traits else 0
+        for trait in self.traits:
+            column = np.asarray(values[trait], dtype=float)
+            self.sum[trait] = column.sum()
+            self.sumsq[trait] = (column * column).sum()
+            self.histogram[trait] = np.bincount(self.bin(trait, column), minlength=self.bins[trait][2]).astype(np.int64)
+
+    def mean(self, trait):
+        return self.sum[trait] / self.count if self.count else 0.0
+
+    def sd(self, trait):
+        if not self.count:
+            return 0.0
+        mean = self.sum[trait] / self.count
+        return max(self.sumsq[trait] / self.count - mean * mean, 0.0) ** 0.5
+
+    def rows(self):
+        ''' [(trait, mean, sd, histogram counts as "c0 c1 ...")] '''
+        return [(trait, self.mean(trait), self.sd(trait), " ".join(map(str, self.histogram[trait].tolist())))
+                for trait in self.traits]
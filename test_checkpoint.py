@@ -0,0 +1,53 @@
+'''
+Resuming from a checkpoint against the same seeded run left uninterrupted.
+
+Box2D's contact impulses, broadphase proxy ids and the float32 centre of
+mass of the bodies are not in a checkpoint, so the two runs may drift
+apart by rounding, but they must keep the same podds, energies and food.
+
+python -m pytest test_checkpoint.py
+'''
+import numpy as np
+import pytest
+
+from settings import FrameworkSettings as FS, LogSettings as LS, OutputSettings as OS, WorldSettings as WS
+
+CHECKPOINT_FRAME = 300
+RESUMED_FRAMES = 300
+
+
+def podd_state(world):
+    ids = sorted(world.podds)
+    positions = np.array([tuple(world.podds[id][0].body.position) for id in ids]).reshape(-1, 2)
+    energies = np.array([world.podds[id][1].energy for id in ids])
+    return ids, positions, energies
+
+
+@pytest.mark.parametrize("seed", [1, 3, 4])
+def test_resume_matches_uninterrupted_run(seed, tmp_path, monkeypatch):
+    monkeypatch.setattr(FS, "headless", True)
+    monkeypatch.setattr(FS, "headless_report_interval", 0)
+    monkeypatch.setattr(LS, "console", False)
+    monkeypatch.setattr(LS, "log_file", str(tmp_path / "evosim.log"))
+    monkeypatch.setattr(WS, "init_podds", 20)
+    monkeypatch.setattr(WS, "random_seed", seed)
+    monkeypatch.setattr(OS, "directory", str(tmp_path))
+    monkeypatch.setattr(OS, "checkpoint_interval", 0)
+    from world import SimWorld
+
+    path = str(tmp_path / "checkpoint.evo")
+    uninterrupted = SimWorld()
+    uninterrupted.run_headless(frames=CHECKPOINT_FRAME)
+    uninterrupted.save_checkpoint(path)
+    uninterrupted.run_headless(frames=RESUMED_FRAMES)
+    resumed = SimWorld(path)
+    resumed.run_headless(frames=RESUMED_FRAMES)
+
+    assert resumed.frame_counter == uninterrupted.frame_counter == CHECKPOINT_FRAME + RESUMED_FRAMES
+    ids, positions, energies = podd_state(uninterrupted)
+    resumed_ids, resumed_positions, resumed_energies = podd_state(resumed)
+    assert resumed_ids == ids
+    assert resumed.next_id == uninterrupted.next_id
+    np.testing.assert_allclose(resumed_energies, energies, atol=1e-6)
+    np.testing.assert_allclose(resumed_positions, positions, atol=0.01)
+    assert sorted(resumed.food) == sorted(uninterrupted.food)
@@ -0,0 +1,156 @@
+'''
+Compiled brain topologies, shared by every Brain with the same connections.
+
+Compiling a brain (finding its compute stack, levels and layer layout) only
+depends on which connections its genome has, not on their weights. Most
+children keep the connections of their parent and only get their weights
+jittered, so the compiled structure is looked up in an LRU cache and a new
+Brain only has to scatter its weights into it.
+'''
+from collections import OrderedDict
+
+import numpy as np
+
+from genome import input_keys, output_keys
+from settings import BrainSettings as BS
+
+
+class Topology:
+    '''
+    The weight independent part of a compiled brain. Connection i of the
+    genome goes to row layer_rows[l], column layer_cols[l] of layer l's
+    weight matrix where layer_conns[l] holds i, and connections that are never
+    evaluated are left out.
+    '''
+
+    def __init__(self, genome):
+        self.input_nodes = input_keys().tolist()  # integer node keys
+        self.output_nodes = output_keys().tolist()
+        ionodes = self.input_nodes + self.output_nodes
+        self.nodelist = {node_id:{"connections":{}} for node_id in ionodes}
+        self.build(genome)
+        self.gen_compute_stack()
+        self.compile()
+        self.complexity = len(self.nodelist) - len(self.input_nodes) - len(self.output_nodes) + 0.1 * len(genome)
+
+    def build(self, genome):
+        ''' nodelist: {node: {"connections": {source node: connection index in the genome}}} '''
+        for i, (src, tgt) in enumerate(zip(genome.src.tolist(), genome.tgt.tolist())):
+            for node_id in (src, tgt):
+                if node_id not in self.nodelist:
+                    self.nodelist[node_id] = {"connections":{}}
+            self.nodelist[tgt]["connections"][src] = i
+
+    def gen_compute_stack(self):
+        self.compute_stack = []
+        nodes_to_crawl = self.output_nodes.copy()
+        while len(nodes_to_crawl) > 0:
+            self.compute_stack += nodes_to_crawl
+            next_level_nodes = []
+            for node_id in nodes_to_crawl:
+                for child_id in self.nodelist[node_id]["connections"]:
+                    if child_id not in self.compute_stack:
+                        self.compute_stack.append(child_id)
+            nodes_to_crawl = next_level_nodes
+
+    def compile(self):
+        '''
+        Flattens the compute_stack into an array program run by Brain.compute.
+
+        Nodes get integer indices (inputs first, then the compute_stack in
+        evaluation order) into a value buffer. The evaluated nodes are grouped
+        into layers that only depend on earlier layers, each with a dense
+        weight matrix over the buffer.
+        '''
+        self.n_inputs = len(self.input_nodes)
+        inputs = set(self.input_nodes)
+        order = [node_id for node_id in reversed(self.compute_stack) if node_id not in inputs]
+
+        # a node only sees the inputs and the nodes evaluated before it, anything else reads as 0
+        level = {node_id: 0 for node_id in self.input_nodes}
+        inbound = {}
+        for node_id in order:
+            connections = [(src, i) for src, i in self.nodelist[node_id]["connections"].items() if src in level]
+            level[node_id] = 1 + max([level[src] for src, _ in connections]) if connections else 0
+            inbound[node_id] = connections
+
+        # index by level so that every layer is a contiguous slice of the buffer
+        ranked = self.input_nodes + sorted(order, key=lambda node_id: level[node_id])
+        index = {node_id: i for i, node_id in enumerate(ranked)}
+        self.layer_bounds = []  # [(start, stop)]
+        self.layer_rows, self.layer_cols, self.layer_conns = [], [], []
+        for lvl in range(1, max(level.values()) + 1):
+            targets = [node_id for node_id in ranked if level[node_id] == lvl and node_id not in inputs]
+            cells = [(row, index[src], i) for row, node_id in enumerate(targets) for src, i in inbound[node_id]]
+            rows, cols, conns = (np.array(column, dtype=np.intp) for column in zip(*cells))
+            by_cell = np.lexsort((cols, rows))  # row major, like np.nonzero of the weight matrix
+            start = index[targets[0]]
+            self.layer_bounds.append((start, start + len(targets)))
+            self.layer_rows.append(rows[by_cell])
+            self.layer_cols.append(cols[by_cell])
+            self.layer_conns.append(conns[by_cell])
+
+        # the same program as a flat edge list (source, target, connection, layer) for batched evaluation
+        self.edge_src = np.concatenate([np.zeros(0, dtype=np.intp)] + self.layer_cols)
+        self.edge_tgt = np.concatenate([np.zeros(0, dtype=np.intp)] + [start + rows for (start, _), rows in zip(self.layer_bounds, self.layer_rows)])
+        self.edge_conn = np.concatenate([np.zeros(0, dtype=np.intp)] + self.layer_conns)
+        self.edge_layer = np.repeat(np.arange(len(self.layer_bounds), dtype=np.intp), [rows.size for rows in self.layer_rows])
+
+        self.node_index = index
+        self.n_nodes = len(index)
+        self.output_index = np.array([index[node_id] for node_id in self.output_nodes])
+
+    def layers(self, weight):
+        ''' [(start, stop, weight matrix)] of a genome with this topology and these connection weights '''
+        layers = []
+        for (start, stop), rows, cols, conns in zip(self.layer_bounds, self.layer_rows, self.layer_cols, self.layer_conns):
+            weights = np.zeros((stop - start, self.n_nodes))
+            weights[rows, cols] = weight[conns]
+            layers.append((start, stop, weights))
+        return layers
+
+
+class TopologyCache:
+    '''
+    LRU cache of Topology objects, keyed on the genome's connections.
+
+    The key keeps the genome's connection order: the compute stack is crawled
+    in that order, so it can change which connections get evaluated. Children
+    inherit their parent's order, so they share its entry.
+    '''
+
+    def __init__(self, capacity=None):
+        self.capacity = BS.topology_cache_size if capacity is None else capacity
+        self.entries = OrderedDict()  # {genome.topology_key(): Topology}, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, genome):
+        key = genome.topology_key()
+        topology = self.entries.get(key)
+        if topology is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return topology
+        self.misses += 1
+        topology = Topology(genome)
+        if self.capacity > 0:
+            self.entries[key] = topology
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return topology
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+topologies = TopologyCache()  # shared by all Brains of the process
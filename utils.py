@@ -1,53 +1,137 @@
+import atexit
+import copy
 import logging
 import os
+import queue
 import sys
 import time
-from datetime import timedelta
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+from settings import LogSettings as LS
 
-FORMATTER = logging.Formatter("%(message)s")
-LOG_FILE = "logs/evosim.log"
+'''
+All loggers put their records on one queue. A background listener thread
+formats them and writes them to stdout and the log file, so the simulation
+thread never waits on console or file I/O. Messages use %-style args and are
+only formatted (in the listener) when their level is enabled.
+'''
 
 def get_console_handler():
    console_handler = logging.StreamHandler(sys.stdout)
-   console_handler.setFormatter(FORMATTER)
+   console_handler.setFormatter(CustomFormatter())
    return console_handler
-def get_file_handler():
-   file_handler = RotatingFileHandler(LOG_FILE, maxBytes=64000, backupCount=10)
-   file_handler.setFormatter(FORMATTER)
+def get_file_handler(log_file=None):
+   log_file = log_file or LS.log_file
+   if os.path.dirname(log_file) and not os.path.exists(os.path.dirname(log_file)):
+      os.makedirs(os.path.dirname(log_file))
+   file_handler = RotatingFileHandler(log_file, maxBytes=LS.max_bytes, backupCount=LS.backup_count)
+   file_handler.setFormatter(CustomFormatter())
    return file_handler
-def get_logger(logger_name):
-   logger = logging.getLogger(logger_name)
-   logger.setLevel(logging.DEBUG) # better to have too much log than not enough
-   logger.addHandler(get_console_handler())
-   logger.addHandler(get_file_handler())
+
+_queue = queue.SimpleQueue()
+_listener = None
+
+def start_listener(log_file=None):
+   '''
+   (Re)starts the background listener writing to the console and log_file
+   (default LogSettings.log_file). Called automatically by get_logger.
+   '''
+   global _listener
+   stop_listener()
+   handlers = [get_file_handler(log_file)]
+   if LS.console:
+      handlers.append(get_console_handler())
+   _listener = QueueListener(_queue, *handlers)
+   _listener.start()
+
+def stop_listener():
+   ''' Writes out all queued records and stops the listener '''
+   global _listener
+   if _listener is not None:
+      _listener.stop()
+      for handler in _listener.handlers:
+         handler.close()
+      _listener = None
+
+atexit.register(stop_listener)
+
+def get_logger(logger_name, subsystem=None):
+   '''
+   Returns a logger whose records go through the queue. With a subsystem
+   (WORLD, BIRTH, DEATH, STATS, ...) the logger is shared by all modules
+   logging for that subsystem and its level is LogSettings.levels[subsystem].
+   '''
+   if _listener is None:
+      start_listener()
+   if subsystem:
+      logger = logging.getLogger(f"evosim.{subsystem}")
+      logger.setLevel(LS.levels.get(subsystem, LS.level))
+   else:
+      logger = logging.getLogger(logger_name)
+      logger.setLevel(LS.level)
+   if not logger.handlers:
+      logger.addHandler(DeferredQueueHandler(_queue))
    # with this pattern, it's rarely necessary to propagate the error up to parent
    logger.propagate = False
-   adapter = CustomAdapter(logger)
-   return adapter
+   return CustomAdapter(logger, {"subsystem": subsystem})
+
+def set_log_level(subsystem, level):
+   ''' Changes the level of a subsystem logger at runtime, eg. set_log_level("WORLD", "DEBUG") '''
+   LS.levels[subsystem] = level
+   logging.getLogger(f"evosim.{subsystem}").setLevel(level)
+
+MUTABLE_ARGS = (list, dict, set, bytearray)
 
-class CustomFormatter:
-   def __init__(self):
-      self.start_time = time.time()
+def snapshot_arg(arg):
+   return copy.copy(arg) if isinstance(arg, MUTABLE_ARGS) else arg
+
+class DeferredQueueHandler(QueueHandler):
+   '''
+   Puts the record on the queue unformatted. The stock QueueHandler formats
+   the message in the calling thread, this leaves it to the listener thread.
+   Mutable args (eg. podd.children) are copied first, or the listener could
+   format them after the simulation changed them.
+   '''
+   def prepare(self, record):
+      if isinstance(record.args, dict):
+         record.args = {key: snapshot_arg(arg) for key, arg in record.args.items()}
+      elif record.args:
+         record.args = tuple(snapshot_arg(arg) for arg in record.args)
+      return record
+
+class Lazy:
+   '''
+   Defers an expensive message argument: func(*args) is only called when the
+   record is formatted, eg. logger.info("Genome: %s", Lazy(podd.print_genome))
+   '''
+   def __init__(self, func, *args):
+      self.func = func
+      self.args = args
+
+   def __str__(self):
+      return str(self.func(*self.args))
+
+class CustomFormatter(logging.Formatter):
+   '''
+   Prefixes the elapsed time since start of script and the subsystem
+   '''
+   start_time = time.time()
 
    def format(self, record):
-      elapsed_seconds = record.created - self.start_time
-      #using timedelta here for convenient default formatting
-      elapsed = timedelta(seconds = elapsed_seconds)
-      return "{} | {}".format(elapsed, record.getMessage())
+      elapsed = record.created - self.start_time
+      parsed_time = f"{elapsed//3600:02.0f}:{elapsed%3600//60:02.0f}:{elapsed%60:02.0f}"
+      subsystem = getattr(record, "subsystem", None)
+      message = record.getMessage()
+      if record.exc_info:
+         message += "\n" + self.formatException(record.exc_info)
+      if subsystem:
+         return f"{parsed_time} | {subsystem} | {message}"
+      return f"{parsed_time} | {message}"
 
 class CustomAdapter(logging.LoggerAdapter):
    """
-   Adds the elapsed time since start of script
+   Tags records with their subsystem, formatting is left to CustomFormatter
    """
-   def __init__(self, logger, extra={}):
-      super().__init__(logger, extra)
-      self.start_time = time.time()
-
    def process(self, msg, kwargs):
-      elapsed = time.time() - self.start_time
-      parsed_time = f"{elapsed//3600:02.0f}:{elapsed%3600//60:02.0f}:{elapsed%60:02.0f}"
-      return f'{parsed_time} | {msg}', kwargs
+      kwargs["extra"] = self.extra
+      return msg, kwargs
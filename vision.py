@@ -0,0 +1,138 @@
+'''
+Batched raycast vision for all podds.
+
+Rays are not cast through Box2D (one Python callback per ray and fixture).
+Instead the candidates around every podd are narrowed with a grid query on
+its vision AABB, and each candidate is only intersected with the rays
+inside its angular extent, all podds in one NumPy pass. Food pellets are circles of radius
+WorldSettings.food_radius, podd bodies are approximated by the
+circumcircle of their triangle.
+'''
+import numpy as np
+
+from settings import BrainSettings as BS, WorldSettings as WS
+
+
+def neighbours(centres, points, cell_size):
+    '''
+    Grid query: for every centre, the points in the 3x3 cells of side
+    cell_size around the centre's cell (a superset of the points within
+    cell_size of it). Returns matching (centre index, point index) arrays.
+    '''
+    if len(centres) == 0 or len(points) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    point_cells = np.floor(points / cell_size).astype(np.int64)
+    centre_cells = np.floor(centres / cell_size).astype(np.int64)
+    # cell key with rows contiguous in y, so a 3 cell column is one key range
+    offset = min(point_cells.min(), centre_cells.min()) - 1
+    span = max(point_cells.max(), centre_cells.max()) - offset + 2
+    keys = (point_cells[:, 0] - offset) * span + point_cells[:, 1] - offset
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+
+    centre_index, lo, hi = [], [], []
+    for dx in (-1, 0, 1):
+        base = (centre_cells[:, 0] + dx - offset) * span + centre_cells[:, 1] - offset
+        lo.append(np.searchsorted(keys, base - 1, side="left"))
+        hi.append(np.searchsorted(keys, base + 1, side="right"))
+        centre_index.append(np.arange(len(centres)))
+    centre_index, lo, hi = np.concatenate(centre_index), np.concatenate(lo), np.concatenate(hi)
+    counts = hi - lo
+    total = counts.sum()
+    # concatenated aranges lo[k]..hi[k]
+    starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    return np.repeat(centre_index, counts), order[starts + np.arange(total)]
+
+
+class Vision:
+    '''
+    Casts BS.vision_rays rays spread over BS.vision_field (at most pi) radians
+    around each podd's heading, from the tip of its body, up to BS.vision_range.
+    Per ray two inputs are written: closeness (1 at the eye, 0 at max range or
+    no hit) and the colour of the nearest hit (0 for no hit).
+    '''
+
+    def __init__(self, n_rays=None, view_range=None, field=None):
+        self.n_rays = BS.vision_rays if n_rays is None else n_rays
+        self.range = BS.vision_range if view_range is None else view_range
+        self.field = BS.vision_field if field is None else field
+        self.offsets = np.linspace(-self.field/2, self.field/2, self.n_rays) if self.n_rays > 1 else np.zeros(self.n_rays)
+        self.food_cache = (None, None)  # (food version, food array)
+
+    def food_array(self, food):
+        version, points = self.food_cache
+        if version != food.version:
+            points = np.array(list(food), dtype=float).reshape(-1, 2)
+            self.food_cache = (food.version, points)
+        return points
+
+    def sense(self, positions, angles, scales, food, out=None):
+        '''
+        positions, angles: (n, 2) and (n,) body transforms of the podds
+        scales: (n,) body half-widths, sqrt(size)
+        food: the world's FoodGrid
+        out: (n, 2*n_rays) array to write into (eg. a slice of the brain input matrix)
+        '''
+        n, n_rays = len(positions), self.n_rays
+        if out is None:
+            out = np.zeros((n, 2 * n_rays))
+        if n == 0 or n_rays == 0:
+            return out
+        # the eye is the tip of the triangle (body origin), the heading is local +y
+        headings = angles + np.pi/2
+        # circumcircle of the triangle (0,0), (-s,-s), (s,-s): centre (0,-s) in body coordinates, radius s
+        body_centres = positions + scales[:, None] * np.column_stack((np.sin(angles), -np.cos(angles)))
+
+        food_points = self.food_array(food)
+        food_podd, food_index = neighbours(positions, food_points, self.range)
+        body_podd, body_index = neighbours(positions, body_centres, self.range + scales.max())
+        not_self = body_podd != body_index
+        body_podd, body_index = body_podd[not_self], body_index[not_self]
+
+        podd = np.concatenate((food_podd, body_podd))
+        centres = np.concatenate((food_points[food_index], body_centres[body_index]))
+        radii = np.concatenate((np.full(len(food_index), WS.food_radius), scales[body_index]))
+        colours = np.concatenate((np.full(len(food_index), BS.vision_food_colour), np.full(len(body_index), BS.vision_podd_colour)))
+
+        # drop candidates out of range
+        rel = centres - positions[podd]
+        dist2 = (rel**2).sum(axis=1)
+        near = dist2 <= (self.range + radii)**2
+        podd, rel, dist2, radii, colours = podd[near], rel[near], dist2[near], radii[near], colours[near]
+
+        # a ray hits a circle iff its angle is within asin(r/d) of the direction to the centre
+        # (pi/2 from inside the circle): only expand the (candidate, ray) pairs in that window
+        phi = (np.arctan2(rel[:, 1], rel[:, 0]) - headings[podd] + np.pi) % (2*np.pi) - np.pi
+        alpha = np.arcsin(np.minimum(radii / np.maximum(np.sqrt(dist2), 1e-12), 1))
+        if n_rays > 1:
+            step = self.field / (n_rays - 1)
+            first = np.maximum(np.ceil((phi - alpha + self.field/2) / step), 0).astype(np.intp)
+            last = np.minimum(np.floor((phi + alpha + self.field/2) / step), n_rays - 1).astype(np.intp)
+        else:
+            first = np.zeros(len(phi), dtype=np.intp)
+            last = np.where(np.abs(phi) <= alpha, 0, -1)
+        counts = np.maximum(last - first + 1, 0)
+        pair = np.repeat(np.arange(len(counts)), counts)
+        ray = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+        # exact distance along each ray
+        ray_angles = headings[podd[pair]] + self.offsets[ray]
+        t = rel[pair, 0] * np.cos(ray_angles) + rel[pair, 1] * np.sin(ray_angles)  # projection on the ray
+        miss2 = dist2[pair] - t**2  # squared distance from the centre to the ray line
+        distance = np.maximum(t - np.sqrt(np.maximum(radii[pair]**2 - miss2, 0)), 0)
+        hit = distance <= self.range
+
+        # nearest hit per (podd, ray)
+        flat = podd[pair][hit] * n_rays + ray[hit]
+        distance, colours = distance[hit], colours[pair][hit]
+        nearest = np.full(n * n_rays, np.inf)
+        np.minimum.at(nearest, flat, distance)
+        colour = np.zeros(n * n_rays)
+        winner = distance == nearest[flat]
+        colour[flat[winner][::-1]] = colours[winner][::-1]  # on ties (eye inside both) the first candidate, food, wins
+
+        seen = np.isfinite(nearest)
+        closeness = np.where(seen, 1 - nearest / self.range, 0)
+        out[:, :n_rays] = closeness.reshape(n, n_rays)
+        out[:, n_rays:] = colour.reshape(n, n_rays)
+        return out
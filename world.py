@@ -1,17 +1,36 @@
 '''
 
 '''
+import logging
+import os
 import random
+import numpy as np
 import Box2D as b2d
+import pygame
 from datetime import datetime
-from math import sqrt
 
+import checkpoint
+import lineage
+import metrics
+import replay
+from bodypool import BodyPool
+from brain_engine import PopulationBrain
 from custom_framework import CustomFramework as Framework, main
-from podd import Podd, generate_brain_genomes
-from settings import FrameworkSettings as FS, WorldSettings as WS, PoddSettings as PS
+from podd import Podd
+from rng import streams
+from population import PoddStore
+from seeds import seed_genomes
+from spatial import FoodGrid, FoodSnapshot
+from sprites import SpriteRenderer
+from settings import FrameworkSettings as FS, WorldSettings as WS, PoddSettings as PS, BrainSettings as BS, OutputSettings as OS
+from sinks import open_sink
+from topology import topologies
 from utils import get_logger
+from vision import Vision
 
-logger = get_logger(__name__)
+world_logger = get_logger(__name__, "WORLD")
+death_logger = get_logger(__name__, "DEATH")
+stats_logger = get_logger(__name__, "STATS")
 
 # constants
 MOVEDIR_FRONT = "forward"
@@ -21,10 +40,14 @@ MOVEDIRS = [MOVEDIR_FRONT, MOVEDIR_LEFT, MOVEDIR_RIGHT]
 SEP = ";"  # delimiter for csv
 
 stranded_id = None
-sample_brains = generate_brain_genomes(WS.init_podds)
+
+def sample_brains():
+    ''' Evolved seed brains for the first podds, generated on first use and then loaded from the seed cache '''
+    return seed_genomes(WS.init_podds)
+
 test_genomes = []
 for _ in range(WS.init_podds):
-    # test_genomes.append({"size":1, "strength":1, "birth_energy":120, "brain":random.choice(sample_brains)})
+    # test_genomes.append({"size":1, "strength":1, "birth_energy":120, "brain":random.choice(sample_brains())})
     test_genomes.append({"size":1, "strength":1, "birth_energy":50, "brain":{"i0005-o0000":1}})
 
 class SimWorld(Framework):
@@ -34,21 +57,35 @@ class SimWorld(Framework):
     # timer
     frame_counter = 0
 
-    def __init__(self):
-        logger.info(f"WORLD | Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    # podd ids: first_id, first_id + id_step, ... (partitioned worlds interleave their ids)
+    first_id = 1
+    id_step = 1
+
+    def __init__(self, checkpoint_file=None):
+        ''' Starts a new world, or resumes the one saved in checkpoint_file '''
+        world_logger.info("Start time: %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
 
         super(SimWorld, self).__init__()
         self.world.gravity = (0, 0)
+        streams.seed(WS.random_seed)  # a resumed world gets the saved states instead
+        self.pool = BodyPool(self.world)  # bodies of dead podds, reused for births
+        self.sprites = SpriteRenderer(self) if self.renderer and FS.sprite_rendering else None
 
         # food
         self.spawn_food_counter = 0
-        self.food = set()
-        for _ in range(WS.init_food):
-            self.add_food()
-            self.add_food()
+        self.food = FoodGrid(WS.food_cell_size)  # set-like, indexed by grid cell
+        if not checkpoint_file:
+            for _ in range(WS.init_food):
+                self.add_food()
+                self.add_food()
 
         self.podds = {}  # {id : (fixture, Podd)}
-        self.next_id = 1  # podd id increments
+        self.store = PoddStore()  # per-frame podd state, by slot
+        self.brains = PopulationBrain()  # every podd's brain by slot, evaluated together
+        self.vision = Vision()
+        self.next_id = self.first_id  # the id of the next podd
+        self.using_contacts = WS.contact_events
+        self.contact_events = (np.zeros((0, 2), dtype=np.int64), np.zeros((0, 2), dtype=np.int64))  # podd id pairs (began, ended) in the last frame
 
         if WS.enable_border:
             c = WS.spawn_food_box/WS.grid
@@ -74,28 +111,126 @@ class SimWorld(Framework):
                     ])
 
         # statistics
-        self.statsfile = "history.csv"
-        with open(self.statsfile, "w") as f:
-            f.write(f"time{SEP}population{SEP}total_food{SEP}avg_energy{SEP}avg_size{SEP}avg_strength\n")
-        self.censusfile = "census.csv"
-        with open(self.censusfile, "w") as f:
-            f.write(f"id{SEP}parent{SEP}genome\n")
+        resume = bool(checkpoint_file)
+        self.history = open_sink("history", ["time", "population", "total_food", "avg_energy", "avg_size", "avg_strength"],
+                                 OS.backend, OS.directory, SEP, OS.flush_interval, OS.max_buffer, append=resume)
+        self.census = open_sink("census", ["id", "parent", "genome"],
+                                OS.backend, OS.directory, SEP, OS.flush_interval, OS.max_buffer, append=resume)
+        self.lineage = lineage.LineageStore(os.path.join(OS.directory, OS.lineage_file), resume, OS.flush_interval,
+                                            OS.max_buffer) if OS.lineage_file else None
+        self.checkpointer = checkpoint.Checkpointer(os.path.join(OS.directory, OS.checkpoint_file)) if OS.checkpoint_interval else None
+        self.checkpoint_frames = max(1, round(OS.checkpoint_interval*FS.hz))
+        if OS.metrics_format not in ("csv", "prometheus"):
+            raise ValueError(f"Unknown metrics format: {OS.metrics_format}")
+        self.metrics = open_sink("metrics", metrics.CSV_COLUMNS, "csv", OS.directory, SEP, OS.flush_interval, OS.max_buffer,
+                                 append=resume) if OS.metrics_interval and OS.metrics_format == "csv" else None
+        self.metrics_frames = max(1, round(OS.metrics_interval*FS.hz))
+        self.population_stats = open_sink("population_stats", ["time", "frame", "population", "trait", "mean", "sd", "histogram"],
+                                          OS.backend, OS.directory, SEP, OS.flush_interval, OS.max_buffer,
+                                          append=resume) if OS.stats_interval else None
+
+        self.replay = replay.Recorder(os.path.join(OS.directory, OS.replay_file), append=resume) if OS.replay_file else None
+
+        if resume:
+            self.restore(checkpoint.read(checkpoint_file))
+            self.discard_records()
+            world_logger.info("Resumed from %s at frame %s", checkpoint_file, self.frame_counter)
+            return
+
+        self.populate()
+
+    def discard_records(self):
+        ''' Drops the records the run wrote after the checkpoint it is resumed from, they are written again '''
+        self.history.discard_after("time", self.frame_counter / FS.hz)
+        self.census.discard_after("id", self.next_id - 1)
+        if self.population_stats:
+            self.population_stats.discard_after("frame", self.frame_counter)
+        if self.metrics:
+            self.metrics.discard_after("frame", self.frame_counter)
 
+    def populate(self):
+        ''' The first podds of a new world '''
         # test
         for genome in test_genomes:
             # self.add_podd(genome, position=(random.randint(-WS.spawn_food_box, WS.spawn_food_box)/10, random.randint(-WS.spawn_food_box, WS.spawn_food_box)/10))
             self.add_podd(genome, position=(0, 0))
+
+    def restore(self, state):
+        '''
+        Rebuilds the world from a checkpoint.capture() state. Bodies are
+        recreated in the saved world body order (oldest first), the podd
+        store and brain engine get back the same slots and row order.
+        Box2D's cached contact impulses, broadphase proxy ids and float32
+        centres of mass can't be set back, so positions may drift slightly
+        from an uninterrupted run (see test_checkpoint.py).
+        '''
+        self.frame_counter = state["frame_counter"]
+        self.spawn_food_counter = state["spawn_food_counter"]
+        self.next_id = state["next_id"]
+        self.stepCount = state["step_count"]
+        self.food.clear()
+        for x, y in state["food"].tolist():
+            self.food.add((x, y))
+
+        saved = state["store"]
+        self.store = PoddStore(saved["capacity"])
+        podds = {}
+        for id, parent, children, genome, slot in state["podds"]:
+            podd = Podd(genome, id, parent, self.store, slot)
+            podd.children = children
+            podds[id] = podd
+        for slot in state["brain_order"]:
+            self.brains.add(slot, self.store.podds[slot].brain)
+        self.store.free = list(saved["free"])
+        self.store.previous_action[:] = saved["previous_action"]
+        for name in self.store.columns:
+            if name in saved:  # checkpoints from before a column was added: keep what allocate() set
+                getattr(self.store, name)[:] = saved[name]
+        self.store.resync_stats()
+
+        fixtures = {}
+        parked = iter(state.get("pool", []))  # bodies parked in the body pool, the rows with id -1
+        for id, x, y, angle, vx, vy, w, awake in state["bodies"].tolist():
+            if id < 0:
+                self.pool.restore(*next(parked))
+                continue
+            podd = podds[int(id)]
+            fixture = self.pool.create(podd.genome["size"], (x, y), angle, podd.id)  # not acquire(): the pool is restored as saved
+            fixture.body.linearVelocity = (vx, vy)
+            fixture.body.angularVelocity = w
+            fixture.body.awake = bool(awake)
+            fixtures[podd.id] = fixture
+        for id, podd in podds.items():
+            self.podds[id] = (fixtures[id], podd)
+        # forces are applied after the physics step and pending at checkpoint time, box2d can't
+        # read them back: apply the saved moves again
+        slots = np.array(self.brains.order, dtype=np.intp)
+        self.apply_moves(slots, self.store.previous_action[slots] > 0)
+
+        random.setstate(state["random_state"])
+        np.random.set_state(state["np_random_state"])
+        if "rng_state" in state:
+            streams.set_state(state["rng_state"])
+
+    def save_checkpoint(self, path=None):
+        ''' Writes a checkpoint now, in the foreground '''
+        checkpoint.write(checkpoint.capture(self), path or os.path.join(OS.directory, OS.checkpoint_file))
     
     def Step(self, settings):
+        timer = self.timer  # per-phase timings, exported every OS.metrics_interval
+        timer.start()
         self.frame_counter += 1
         # food spawn and display
         self.spawn_food_counter += 1
         if self.spawn_food_counter >= WS.spawn_food_interval and len(self.food) < WS.max_food:
             self.spawn_food_counter = 0
             self.add_food()
-        self.display_food()
+        timer.mark("food_spawn")
+        if self.renderer:
+            self.display_food()
+        timer.mark("display_food")
 
-        # run physics
+        # run physics (timed as physics and draw)
         super(SimWorld, self).Step(settings)
 
         # check for food overlay
@@ -103,19 +238,32 @@ class SimWorld(Framework):
             hits = self.is_touching_food(id, obj[0])
             for hit in hits:
                 self.food.remove(hit)
-                obj[1].energy += WS.food_energy
+                self.store.add_energy(obj[1].slot, WS.food_energy)
+        timer.mark("food_collision")
 
-        # podd movements
-        for fixture, podd in self.podds.values():
-            move_actions = podd.step([], len(self.podds))
-            for i, move in enumerate(move_actions):
-                if move:
-                    self.move_obj(fixture, MOVEDIRS[i], podd.attr["strength"])
-        
-        for dead_podd in [podd for fixture, podd in self.podds.values() if podd.dead]:
-            self.kill_podd(dead_podd.id)
-        for parent_podd in [podd for fixture, podd in self.podds.values() if podd.give_birth]:
-            self.birth_podd(parent_podd.id)
+        # podd movements: one batched brain pass and vectorized upkeep for the whole population
+        slots = np.array(self.brains.order, dtype=np.intp)
+        inputs = self.brains.inputs
+        self.store.observe(slots, inputs[:, :BS.n_internal_inputs])
+        if self.vision.n_rays:
+            positions, angles = self.body_transforms(slots)
+            self.vision.sense(positions, angles, np.sqrt(self.store.size[slots]), self.food, inputs[:, BS.n_internal_inputs:])
+        timer.mark("observe")
+        brain_outputs = self.brains.compute(inputs)
+        moves = self.store.act(slots, brain_outputs, len(self.podds))
+        self.apply_moves(slots, moves)
+        timer.mark("brain_actions")
+
+        for slot in self.store.dead_slots():
+            self.kill_podd(self.store.podds[slot].id)
+        timer.mark("deaths")
+        for slot in self.store.birth_slots():
+            self.birth_podd(self.store.podds[slot].id)
+        timer.mark("births")
+
+        if self.replay:
+            self.replay.capture(self)
+        timer.mark("replay")
 
         # do every 10s
         if self.frame_counter % (10*FS.hz) == 0:
@@ -124,50 +272,191 @@ class SimWorld(Framework):
                 if fixture.body.position[0] < -WS.spawn_food_box/WS.grid or fixture.body.position[0] > WS.spawn_food_box/WS.grid or \
                    fixture.body.position[1] < -WS.spawn_food_box/WS.grid or fixture.body.position[1] > WS.spawn_food_box/WS.grid:
                     podd.dead = True  # kill podds which are outside food_box in the next frame
-                    logger.info(f"DEATH | {podd.id} died. Cause: stranded Age: {podd.age:02f} Children: {podd.children}")
+                    death_logger.info("%s died. Cause: stranded Age: %02f Children: %s", podd.id, podd.age, podd.children)
+        if self.population_stats and self.frame_counter % max(1, round(OS.stats_interval*FS.hz)) == 0:
+            self.sample_stats()
+        if OS.metrics_interval and self.frame_counter % self.metrics_frames == 0:
+            self.export_metrics()
+        timer.mark("stats")
+
+        # last: a resumed world starts where this frame ended, including what the 10s checks decided
+        if self.checkpointer and self.frame_counter % self.checkpoint_frames == 0:
+            self.checkpointer.save(self)
+        timer.mark("checkpoint")
+        timer.end_frame(len(self.podds))
+
+    def ContactEvents(self, began, ended):
+        self.contact_events = (began, ended)
+
+    def Shutdown(self):
+        if self.checkpointer:
+            self.checkpointer.close()
+        self.history.close()
+        self.census.close()
+        if self.lineage:
+            self.lineage.close()
+        if self.metrics:
+            self.metrics.close()
+        if self.population_stats:
+            self.population_stats.close()
+        if self.replay:
+            self.replay.close()
+
+    def StopCondition(self):
+        # end headless runs on extinction
+        return len(self.podds) == 0
+
+    def export_metrics(self):
+        ''' Writes the per-phase frame timings: rows of metrics.csv or the metrics.prom text file '''
+        population = len(self.podds)
+        if self.metrics:
+            for row in self.timer.csv_rows(self.frame_counter // FS.hz, self.frame_counter, population):
+                self.metrics.write(*row)
+        else:
+            metrics.write_prometheus(self.timer.prometheus(self.frame_counter, population), os.path.join(OS.directory, "metrics.prom"))
+
+    def sample_stats(self):
+        ''' One population_stats row per trait: mean, standard deviation and histogram, from the running stats '''
+        time_s = self.frame_counter / FS.hz
+        population = self.store.stats.count
+        for row in self.store.stats.rows():
+            self.population_stats.write(time_s, self.frame_counter, population, *row)
 
     def add_food(self, p=None):
         if p:
             self.food.add(p)
         else:
-            self.food.add((random.randint(-WS.spawn_food_box, WS.spawn_food_box)/10, random.randint(-WS.spawn_food_box, WS.spawn_food_box)/10))
+            box = WS.spawn_food_box
+            self.food.add(((streams.food.integers(2*box + 1) - box)/10, (streams.food.integers(2*box + 1) - box)/10))
 
     def is_touching_food(self, id, fixture):
         transform = b2d.b2Transform()
         transform.angle = fixture.body.angle
         transform.position = fixture.body.position
-        hits = []
-        for p in self.food:
-            hit = fixture.shape.TestPoint(transform, p)
-            if hit:
-                logger.debug(f"WORLD | Food hit detected: {id} - {p}")
-                hits.append(p)
+        aabb = fixture.shape.getAABB(transform, 0)
+        hits = [p for p in self.food.query(aabb.lowerBound, aabb.upperBound) if fixture.shape.TestPoint(transform, p)]
+        if hits and world_logger.isEnabledFor(logging.DEBUG):
+            for p in hits:
+                world_logger.debug("Food hit detected: %s - %s", id, p)
         return hits
 
     def display_food(self):
+        if self.sprites:
+            self.sprites.draw_food(self.renderer.surface, self.food)
+            return
         for p in self.food:
-            self.renderer.DrawSolidCircle(self.renderer.to_screen(p), 0.25, (0, 0), b2d.b2Color((0, 1.0, 0)))
+            self.renderer.DrawSolidCircle(self.renderer.to_screen(p), WS.food_radius, (0, 0), b2d.b2Color((0, 1.0, 0)))
+
+    def DrawWorld(self):
+        settings = self.settings
+        if not self.sprites or settings.drawJoints or settings.drawAABBs or settings.drawPairs or settings.drawCOMs:
+            return super(SimWorld, self).DrawWorld()
+        if not settings.drawShapes:
+            return
+        podds = [(fixture.body, podd) for fixture, podd in self.podds.values()]
+        positions = np.array([tuple(body.position) for body, _ in podds], dtype=float).reshape(-1, 2)
+        angles = np.array([body.angle for body, _ in podds], dtype=float)
+        scales = np.sqrt([podd.genome["size"] for _, podd in podds])
+        awake = [body.awake for body, _ in podds]
+        self.sprites.draw_podds(self.renderer.surface, positions, angles, scales, awake)
+
+        # the few other bodies through the debug draw shapes
+        renderer = self.renderer
+        for body in (getattr(self, "border", None), self.bomb):
+            if body is None:
+                continue
+            colour = b2d.b2Color(0.5, 0.9, 0.5) if body.type == b2d.b2_staticBody else b2d.b2Color(0.9, 0.7, 0.7)
+            for fixture in body.fixtures:
+                shape = fixture.shape
+                if isinstance(shape, b2d.b2CircleShape):
+                    renderer.DrawSolidCircle(renderer.to_screen(body.GetWorldPoint(shape.pos)), shape.radius, (0, 0), colour)
+                else:
+                    vertices = [renderer.to_screen(body.GetWorldPoint(v)) for v in shape.vertices]
+                    if len(vertices) == 2:
+                        renderer.DrawSegment(*vertices, colour)
+                    else:
+                        renderer.DrawSolidPolygon(vertices, colour)
+
+    def Snapshot(self):
+        ''' Podd transforms, food and counters for the decoupled viewer (see run_decoupled) '''
+        if getattr(self, "food_snapshot", None) is None or self.food_snapshot.version != self.food.version:
+            self.food_snapshot = FoodSnapshot(self.food, getattr(self, "food_snapshot", None))
+        podds = [(id, fixture.body, podd) for id, (fixture, podd) in self.podds.items()]
+        return {
+            "frame": self.frame_counter,
+            "ids": np.array([id for id, _, _ in podds], dtype=np.int64),
+            "positions": np.array([tuple(body.position) for _, body, _ in podds], dtype=float).reshape(-1, 2),
+            "angles": np.array([body.angle for _, body, _ in podds], dtype=float),
+            "scales": np.sqrt([podd.genome["size"] for _, _, podd in podds]),
+            "awake": [body.awake for _, body, _ in podds],
+            "food": self.food_snapshot,
+        }
+
+    def DrawSnapshot(self, previous, latest, alpha):
+        if self.sprites is None:
+            self.sprites = SpriteRenderer(self)
+        positions, angles = latest["positions"], latest["angles"]
+        if previous is not None and alpha < 1:
+            # move the podds alive in both snapshots the alpha of the way from previous to latest
+            _, i_previous, i_latest = np.intersect1d(previous["ids"], latest["ids"], assume_unique=True, return_indices=True)
+            positions, angles = positions.copy(), angles.copy()
+            start, turn = previous["positions"][i_previous], latest["angles"][i_latest] - previous["angles"][i_previous]
+            positions[i_latest] = start + alpha * (latest["positions"][i_latest] - start)
+            angles[i_latest] = previous["angles"][i_previous] + alpha * turn
+        self.sprites.draw_food(self.screen, latest["food"])
+        self.sprites.draw_podds(self.screen, positions, angles, latest["scales"], latest["awake"])
+        if WS.enable_border:
+            if getattr(self, "border_segments", None) is None:
+                self.border_segments = [[tuple(self.border.GetWorldPoint(v)) for v in fixture.shape.vertices] for fixture in self.border.fixtures]
+            for segment in self.border_segments:
+                pygame.draw.aaline(self.screen, (127, 230, 127), *self.sprites.to_screen(segment).tolist())
+        self.Print("Frame %d population %d food %d" % (latest["frame"], len(latest["ids"]), len(latest["food"])))
+
+    def create_body(self, genome, position, angle, id):
+        return self.pool.acquire(genome["size"], position, angle, id)
 
     def add_podd(self, genome, position=(0, 0), parent=None):
-        scale = sqrt(genome["size"])
-        shape = b2d.b2PolygonShape(vertices=[(0, 0), (-scale, -scale), (scale, -scale)])
-        body = self.world.CreateDynamicBody(position=position, angle=random.random()*6.28, angularDamping=5, linearDamping=0.1)
-        main_fixture = body.CreateFixture(shape=shape, density=WS.test_density, friction=0.3)
-        self.podds[self.next_id] = (main_fixture, Podd(genome, self.next_id, parent))
-        self.next_id += 1
-        with open(self.censusfile, "a") as f:
-            f.write(f"{self.next_id-1}{SEP}{parent}{SEP}{genome}\n")
-        return self.next_id - 1
+        id = self.next_id
+        main_fixture = self.create_body(genome, position, streams.spawn.random()*6.28, id)
+        podd = Podd(genome, id, parent, self.store)
+        self.podds[id] = (main_fixture, podd)
+        self.brains.add(podd.slot, podd.brain)
+        self.next_id += self.id_step
+        self.census.write(id, parent, genome)
+        if self.lineage:
+            self.lineage.birth(id, parent, self.frame_counter)
+        return id
 
     def kill_podd(self, id):
-        self.world.DestroyBody(self.podds[id][0].body)
-        self.podds.pop(id, None)
+        fixture, podd = self.podds.pop(id)
+        self.pool.release(fixture.body, podd.genome["size"])
+        self.brains.remove(podd.slot)
+        self.store.release(podd.slot)
+        if self.lineage:
+            self.lineage.death(id, self.frame_counter)
 
     def birth_podd(self, id):
         new_podd_genome = self.podds[id][1].new_genome(self.next_id)
         self.podds[id][1].children.append(self.next_id)
         self.add_podd(new_podd_genome, self.podds[id][0].body.position, id)
 
+    def body_transforms(self, slots):
+        ''' Body positions (n, 2) and angles (n,) of the podds in slots '''
+        bodies = [self.podds[self.store.podds[slot].id][0].body for slot in slots.tolist()]
+        positions = np.array([tuple(body.position) for body in bodies], dtype=float).reshape(-1, 2)
+        angles = np.array([body.angle for body in bodies], dtype=float)
+        return positions, angles
+
+    def apply_moves(self, slots, moves):
+        ''' Applies the move actions (boolean matrix, one row per slot) as forces for the next physics step '''
+        for slot, move_actions in zip(slots.tolist(), moves.tolist()):
+            if not any(move_actions):
+                continue
+            fixture = self.podds[self.store.podds[slot].id][0]
+            for i, move in enumerate(move_actions):
+                if move:
+                    self.move_obj(fixture, MOVEDIRS[i], self.store.strength[slot])
+
     def move_obj(self, fixture, movement, strength):
         if movement == MOVEDIR_FRONT:
             fixture.body.ApplyForce(force=fixture.body.GetWorldVector(localVector=(0.0, strength)), point=fixture.body.worldCenter, wake=True)
@@ -183,12 +472,15 @@ class SimWorld(Framework):
         if population == 0:
             return
         total_food = len(self.food)
-        avg_net_energy = sum([podd[1].energy - podd[1].min_energy for podd in self.podds.values()])/population
-        avg_size = sum([podd[1].attr["size"] for podd in self.podds.values()])/population
-        avg_strength = sum([podd[1].attr["strength"] for podd in self.podds.values()])/population
-        with open(self.statsfile, "a") as f:
-            f.write(f"{time_s}{SEP}{population}{SEP}{total_food}{SEP}{avg_net_energy}{SEP}{avg_size}{SEP}{avg_strength}\n")
-        logger.info(f"STATS | {time_s=} {population=} {total_food=} {avg_net_energy=}")
+        stats = self.store.stats
+        self.store.resync_stats()  # drop the rounding error of the running sums
+        avg_net_energy = stats.mean("energy")
+        avg_size = stats.mean("size")
+        avg_strength = stats.mean("strength")
+        self.history.write(time_s, population, total_food, avg_net_energy, avg_size, avg_strength)
+        stats_logger.info("time_s=%s population=%s total_food=%s avg_net_energy=%s topology_cache=%s/%s hits (%.2f) body_pool=%s parked, %s/%s hits (%.2f)",
+                          time_s, population, total_food, avg_net_energy, topologies.hits, topologies.hits + topologies.misses, topologies.hit_rate,
+                          self.pool.size, self.pool.hits, self.pool.hits + self.pool.misses, self.pool.hit_rate)
 
 if __name__ == "__main__":
     main(SimWorld)
\ No newline at end of file